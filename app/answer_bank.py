@@ -0,0 +1,101 @@
+# app/answer_bank.py
+"""
+Banco de respostas pré-computadas para as perguntas mais frequentes.
+
+scripts/build_answer_bank.py roda cada pergunta de config/faq_questions.json
+por retrieve + generate_answer, em cada estilo do prompts.yaml, e grava aqui
+(SQLite embutido) a resposta, as fontes, a versão do índice e o embedding da
+pergunta. O /chat consulta o banco antes de tudo: se a pergunta do usuário
+for parecida o bastante com uma pergunta do banco (similaridade de cosseno)
+e a entrada for da versão atual do índice, a resposta sai sem chamar o LLM.
+"""
+import json
+import pathlib
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    question      TEXT NOT NULL,
+    style         TEXT NOT NULL,
+    answer        TEXT NOT NULL,
+    sources       TEXT NOT NULL,
+    index_version TEXT NOT NULL,
+    embedding     BLOB NOT NULL,
+    created_at    INTEGER NOT NULL,
+    PRIMARY KEY (question, style)
+)
+"""
+
+
+class AnswerBank:
+    def __init__(self, path: pathlib.Path, min_similarity: float = 0.95):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.min_similarity = min_similarity
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+        # cache em memória: (versão, estilo) -> (matriz de embeddings, respostas)
+        self._cache: Dict[Tuple[str, str], Tuple[np.ndarray, List[str]]] = {}
+        self._load_cache()
+
+    def _load_cache(self):
+        rows = self._conn.execute(
+            "SELECT style, index_version, answer, embedding FROM answers"
+        ).fetchall()
+        groups: Dict[Tuple[str, str], Tuple[list, list]] = {}
+        for style, version, answer, emb in rows:
+            embs, answers = groups.setdefault((version, style), ([], []))
+            embs.append(np.frombuffer(emb, dtype=np.float32))
+            answers.append(answer)
+        self._cache = {key: (np.vstack(e), a) for key, (e, a) in groups.items()}
+
+    def lookup(self, q_emb: np.ndarray, style: str, index_version: str | None) -> str | None:
+        """Resposta pronta para a pergunta (embedding normalizado), se houver."""
+        entry = self._cache.get((index_version, style))
+        if entry is None:
+            return None
+        embs, answers = entry
+        sims = embs @ q_emb.reshape(-1)
+        best = int(np.argmax(sims))
+        if sims[best] < self.min_similarity:
+            return None
+        return answers[best]
+
+    def put(self, question: str, style: str, answer: str, sources: List[str],
+            index_version: str, q_emb: np.ndarray):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (question, style, answer, json.dumps(sources, ensure_ascii=False),
+                 index_version, np.asarray(q_emb, dtype=np.float32).reshape(-1).tobytes(),
+                 int(time.time())),
+            )
+            self._conn.commit()
+            self._load_cache()
+
+    def stale(self, questions: List[str], styles: List[str], index_version: str) -> List[Tuple[str, str]]:
+        """Pares (pergunta, estilo) ausentes ou gerados com outra versão do índice."""
+        current = {
+            (q, st) for q, st in self._conn.execute(
+                "SELECT question, style FROM answers WHERE index_version = ?", (index_version,)
+            )
+        }
+        return [(q, st) for q in questions for st in styles if (q, st) not in current]
+
+    def prune(self, index_version: str) -> int:
+        """Apaga entradas de versões antigas do índice."""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM answers WHERE index_version != ?", (index_version,))
+            self._conn.commit()
+            self._load_cache()
+        return cur.rowcount
+
+    def __len__(self):
+        return sum(len(a) for _, a in self._cache.values())
@@ -0,0 +1,115 @@
+# app/api/admin.py
+import re
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse
+from ..deps import ADMIN_API_KEY, PROFILE_DIR, get_store
+from ..profiling import list_profiles
+from ..schemas import DocumentIn
+from ..shards import LIVE_SHARD
+from ..rag import start_answer_bank_refresh
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+def require_admin(x_api_key: str | None):
+    """Rotas /admin só funcionam com ADMIN_API_KEY definida e enviada em X-Api-Key."""
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Rotas de admin desabilitadas (ADMIN_API_KEY não definida).")
+    if x_api_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=401, detail="X-Api-Key inválida.")
+
+
+@router.get("/shards")
+def list_shards(x_api_key: str | None = Header(None)):
+    require_admin(x_api_key)
+    s = get_store()
+    return {
+        "version": s.index_version,
+        "shards": {
+            name: {"chunks": len(sh), "version": sh.version, "mutable": sh.mutable,
+                   "remote": getattr(sh, "base_url", None)}
+            for name, sh in s.shards.items()
+        },
+    }
+
+
+@router.post("/shards/reload")
+def reload_shards(x_api_key: str | None = Header(None)):
+    require_admin(x_api_key)
+    reloaded = get_store().reload_shards()
+    if reloaded:
+        start_answer_bank_refresh()
+    return {"reloaded": reloaded}
+
+
+@router.post("/shards/{name}/reload")
+def reload_shard(name: str, x_api_key: str | None = Header(None)):
+    require_admin(x_api_key)
+    try:
+        sh = get_store().reload_shard(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Shard '{name}' não está no manifest.")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    start_answer_bank_refresh()
+    return {"shard": name, "chunks": len(sh), "version": sh.version}
+
+
+@router.post("/documents")
+def add_document(doc: DocumentIn, x_api_key: str | None = Header(None)):
+    """Indexa (ou substitui) um documento no shard live; buscável ao retornar."""
+    require_admin(x_api_key)
+    try:
+        chunks = get_store().upsert_document(doc.url, doc.text)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"url": doc.url, "shard": LIVE_SHARD, "chunks": chunks}
+
+
+@router.delete("/documents")
+def delete_document(url: str, x_api_key: str | None = Header(None)):
+    require_admin(x_api_key)
+    removed = get_store().delete_document(url)
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"Documento '{url}' não está no shard {LIVE_SHARD}.")
+    return {"url": url, "removed_chunks": removed}
+
+
+@router.post("/live/compact")
+def compact_live(x_api_key: str | None = Header(None)):
+    """Força a compactação do shard live (grava em disco e trunca o WAL)."""
+    require_admin(x_api_key)
+    s = get_store()
+    compacted = s.compact_live()
+    if compacted:
+        start_answer_bank_refresh()
+    return {"compacted": compacted, "version": s.index_version}
+
+
+def _profile_file(profile_id: str, ext: str):
+    if not re.fullmatch(r"[\w-]+", profile_id):
+        raise HTTPException(status_code=400, detail="id de profile inválido.")
+    fp = PROFILE_DIR / f"{profile_id}.{ext}"
+    if not fp.exists():
+        raise HTTPException(status_code=404, detail=f"Profile '{profile_id}' não encontrado.")
+    return fp
+
+
+@router.get("/profiles")
+def profiles(limit: int = 50, x_api_key: str | None = Header(None)):
+    require_admin(x_api_key)
+    return {"profiles": list_profiles(PROFILE_DIR, limit)}
+
+
+@router.get("/profiles/{profile_id}")
+def profile(profile_id: str, x_api_key: str | None = Header(None)):
+    """Tempos por etapa + funções mais caras (cProfile) de uma requisição."""
+    require_admin(x_api_key)
+    return FileResponse(_profile_file(profile_id, "json"), media_type="application/json")
+
+
+@router.get("/profiles/{profile_id}/prof")
+def profile_raw(profile_id: str, x_api_key: str | None = Header(None)):
+    """Arquivo .prof bruto (abra com snakeviz ou pstats)."""
+    require_admin(x_api_key)
+    return FileResponse(_profile_file(profile_id, "prof"), filename=f"{profile_id}.prof")
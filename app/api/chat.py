@@ -1,14 +1,21 @@
 import logging
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from ..schemas import ChatIn, ChatOut
 from ..rag import generate_answer
+from ..deps import ADMIN_API_KEY, PROFILE_DIR, PROFILE_KEEP, PROFILE_SAMPLE_RATE
+from .. import profiling
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 @router.post("", response_model=ChatOut)
-def chat(p: ChatIn):
+def chat(p: ChatIn, request: Request, response: Response):
+    # profiling opt-in (header ou ?debug_profile=1, sempre com a chave de admin no header) ou por amostragem
+    reason = profiling.requested_reason(request.headers, request.query_params, ADMIN_API_KEY, PROFILE_SAMPLE_RATE)
     try:
-        answer = generate_answer(p.question, style=p.style or "default")
+        with profiling.maybe_profile(reason, p.question, PROFILE_DIR, keep=PROFILE_KEEP) as prof:
+            answer = generate_answer(p.question, style=p.style or "default", mode=p.mode or "auto")
+        if prof is not None:
+            response.headers["X-Profile-Id"] = prof.id
         return ChatOut(answer=answer)
     except Exception as e:
         logging.exception("Erro no /chat")
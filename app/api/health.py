@@ -1,5 +1,7 @@
 # app/api/health.py
-from fastapi import APIRouter
+from fastapi import APIRouter, Header
+from ..deps import get_store
+from .admin import require_admin
 
 router = APIRouter(tags=["meta"])
 
@@ -10,3 +12,12 @@ def health():
 @router.get("/version")
 def version():
     return {"app": "cloudwalk-chatbot", "rev": "v1"}
+
+@router.get("/llm/stats")
+def llm_stats(x_api_key: str | None = Header(None)):
+    """
+    Latência (TTFT/total), taxa de vitória e estado do circuito por backend LLM.
+    Exige a chave de admin: a resposta traz o base_url (hosts internos) de cada backend.
+    """
+    require_admin(x_api_key)
+    return get_store().llm.stats()
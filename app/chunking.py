@@ -0,0 +1,56 @@
+# app/chunking.py
+"""
+Chunking dos documentos raspados.
+
+Usado pelo scrape.py (etapa "chunk" do pipeline), que grava os chunks de cada
+página em data/chunks/pages/<md5(url)>.json junto com o hash do texto, e pelo
+build_index.py, que reaproveita esses chunks quando o texto não mudou.
+"""
+import hashlib
+import json
+import pathlib
+
+CHUNK_SIZE = 900
+CHUNK_OVERLAP = 150
+MIN_WORDS = 60
+
+
+def chunk(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    words=text.split(); i=0; out=[]
+    while i < len(words):
+        out.append(" ".join(words[i:i+size])); i += (size-overlap)
+    return [t for t in out if len(t.split())>MIN_WORDS]
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _page_path(pages_dir: pathlib.Path, url: str) -> pathlib.Path:
+    return pathlib.Path(pages_dir) / f"{hashlib.md5(url.encode()).hexdigest()}.json"
+
+
+def save_chunks(pages_dir: pathlib.Path, url: str, text: str, chunks: list[str]):
+    fp = _page_path(pages_dir, url)
+    fp.parent.mkdir(parents=True, exist_ok=True)
+    fp.write_text(json.dumps({
+        "url": url,
+        "hash": content_hash(text),
+        "size": CHUNK_SIZE, "overlap": CHUNK_OVERLAP,
+        "chunks": chunks,
+    }, ensure_ascii=False), encoding="utf-8")
+
+
+def load_chunks(pages_dir: pathlib.Path, url: str, text: str) -> list[str] | None:
+    """Chunks já calculados para este texto (None se não houver ou se o texto mudou)."""
+    fp = _page_path(pages_dir, url)
+    if not fp.exists():
+        return None
+    try:
+        data = json.loads(fp.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    if (data.get("hash") != content_hash(text)
+            or data.get("size") != CHUNK_SIZE or data.get("overlap") != CHUNK_OVERLAP):
+        return None
+    return data["chunks"]
@@ -0,0 +1,162 @@
+# app/corpus.py
+"""
+Corpus bruto (texto extraído de cada página) comprimido e endereçado por conteúdo.
+
+Substitui um data/raw/<md5(url)>.txt por página. Layout em data/corpus/:
+
+- segments/seg-00001.gz ...  -> cada texto é um membro gzip independente,
+                                anexado ao segmento ativo (novo segmento a
+                                cada SEGMENT_MAX_BYTES)
+- objects.jsonl              -> sha1 do texto -> segmento, offset, tamanhos
+- urls.jsonl                 -> url -> sha1 + metadados da coleta
+                                (fetched_at, etag, last_modified...); a
+                                última linha de cada URL vale
+
+Textos iguais sob URLs diferentes (espelhos, URLs com fragmento) são gravados
+uma vez só. get() lê um documento com um seek; iter_docs() percorre os
+segmentos em ordem, para o build_index.py ler tudo sequencialmente.
+Os .jsonl são só de append: nada é reescrito.
+"""
+import gzip
+import hashlib
+import json
+import pathlib
+import threading
+import time
+from typing import Dict, Iterator, List
+
+DEFAULT_ROOT = pathlib.Path("data/corpus")
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _read_jsonl(fp: pathlib.Path) -> Iterator[dict]:
+    if not fp.exists():
+        return
+    with open(fp, encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue   # última linha truncada por um crash
+
+
+class CorpusStore:
+    def __init__(self, root: pathlib.Path = DEFAULT_ROOT, segment_max_bytes: int = SEGMENT_MAX_BYTES):
+        self.root = pathlib.Path(root)
+        self.seg_dir = self.root / "segments"
+        self.segment_max_bytes = segment_max_bytes
+        self._lock = threading.Lock()
+
+        self.objects: Dict[str, dict] = {r["hash"]: r for r in _read_jsonl(self.root / "objects.jsonl")}
+        self.urls: Dict[str, dict] = {}
+        self.deleted: set = set()   # URLs apagadas (e não regravadas depois)
+        for r in _read_jsonl(self.root / "urls.jsonl"):
+            if r.get("deleted"):
+                self.urls.pop(r["url"], None)
+                self.deleted.add(r["url"])
+            else:
+                self.urls[r["url"]] = r
+                self.deleted.discard(r["url"])
+
+    def __len__(self):
+        return len(self.urls)
+
+    def __contains__(self, url: str):
+        return url in self.urls
+
+    # ---------- escrita ----------
+
+    def _active_segment(self, incoming: int) -> pathlib.Path:
+        self.seg_dir.mkdir(parents=True, exist_ok=True)
+        segs = sorted(self.seg_dir.glob("seg-*.gz"))
+        if segs and segs[-1].stat().st_size + incoming <= self.segment_max_bytes:
+            return segs[-1]
+        return self.seg_dir / f"seg-{len(segs) + 1:05d}.gz"
+
+    def _append(self, name: str, record: dict):
+        with open(self.root / name, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def put(self, url: str, text: str, **meta) -> bool:
+        """
+        Grava o texto da URL (com metadados da coleta). Retorna True se o
+        conteúdo da URL mudou em relação ao que estava gravado.
+        """
+        h = content_hash(text)
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            if h not in self.objects:
+                raw = text.encode("utf-8")
+                blob = gzip.compress(raw, mtime=0)
+                seg = self._active_segment(len(blob))
+                with open(seg, "ab") as fh:
+                    offset = fh.tell()
+                    fh.write(blob)
+                obj = {"hash": h, "segment": seg.name, "offset": offset, "length": len(blob), "size": len(raw)}
+                self._append("objects.jsonl", obj)
+                self.objects[h] = obj
+            changed = self.urls.get(url, {}).get("hash") != h
+            rec = {"url": url, "hash": h, "fetched_at": int(time.time()), **meta}
+            self._append("urls.jsonl", rec)
+            self.urls[url] = rec
+            self.deleted.discard(url)
+        return changed
+
+    def delete(self, url: str):
+        """Tira a URL do corpus (o blob fica no segmento, possivelmente usado por outra URL)."""
+        with self._lock:
+            if self.urls.pop(url, None) is not None:
+                self._append("urls.jsonl", {"url": url, "deleted": True, "fetched_at": int(time.time())})
+                self.deleted.add(url)
+
+    # ---------- leitura ----------
+
+    def get_blob(self, h: str) -> str:
+        obj = self.objects[h]
+        with open(self.seg_dir / obj["segment"], "rb") as fh:
+            fh.seek(obj["offset"])
+            return gzip.decompress(fh.read(obj["length"])).decode("utf-8")
+
+    def get(self, url: str) -> str | None:
+        rec = self.urls.get(url)
+        return self.get_blob(rec["hash"]) if rec else None
+
+    def meta(self, url: str) -> dict | None:
+        return self.urls.get(url)
+
+    def iter_docs(self) -> Iterator[dict]:
+        """{"url", "text"} de todas as URLs, lendo cada segmento em ordem uma vez."""
+        by_hash: Dict[str, List[str]] = {}
+        for url, rec in self.urls.items():
+            by_hash.setdefault(rec["hash"], []).append(url)
+        objs = sorted((self.objects[h] for h in by_hash), key=lambda o: (o["segment"], o["offset"]))
+        fh, current = None, None
+        try:
+            for obj in objs:
+                if obj["segment"] != current:
+                    if fh:
+                        fh.close()
+                    fh, current = open(self.seg_dir / obj["segment"], "rb"), obj["segment"]
+                fh.seek(obj["offset"])   # sequencial na prática: os offsets vêm em ordem
+                text = gzip.decompress(fh.read(obj["length"])).decode("utf-8")
+                for url in by_hash[obj["hash"]]:
+                    yield {"url": url, "text": text}
+        finally:
+            if fh:
+                fh.close()
+
+    def stats(self) -> dict:
+        raw = sum(o["size"] for o in self.objects.values())
+        stored = sum(o["length"] for o in self.objects.values())
+        return {
+            "urls": len(self.urls),
+            "blobs": len(self.objects),
+            "segments": len(list(self.seg_dir.glob("seg-*.gz"))) if self.seg_dir.exists() else 0,
+            "raw_bytes": raw,
+            "stored_bytes": stored,
+            "ratio": round(stored / raw, 4) if raw else None,
+        }
@@ -0,0 +1,121 @@
+# app/dedup.py
+"""
+Detecção de quase-duplicatas (MinHash + LSH) sobre shingles de palavras.
+
+Usado em dois pontos:
+- scripts/build_index.py: entre o corpus bruto e os embeddings, colapsa chunks
+  quase idênticos num único chunk canônico que guarda todas as URLs de origem;
+- app/rag.py: no retrieve(), com minhash()/similarity() conforme os textos dos
+  candidatos são lidos, descarta hits que são quase cópia de outro hit já
+  selecionado (ex.: SEED_DOCS x páginas raspadas).
+
+Não depende de nada além de numpy; os hashes usam zlib.crc32 para serem
+estáveis entre processos (o hash() do Python muda com PYTHONHASHSEED).
+"""
+import re
+import zlib
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 16                 # 16 bandas x 4 linhas -> limiar "natural" ~0.5
+DUP_THRESHOLD = 0.85       # Jaccard estimado a partir do qual consideramos duplicata
+
+_MERSENNE = np.uint64((1 << 31) - 1)
+_rng = np.random.RandomState(1337)
+_PERM_A = _rng.randint(1, (1 << 31) - 1, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, (1 << 31) - 1, size=NUM_PERM).astype(np.uint64)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def shingles(text: str, k: int = SHINGLE_SIZE) -> np.ndarray:
+    """Hashes (crc32) dos k-shingles de palavras normalizadas do texto."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < k:
+        words = words or [""]
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + k]) for i in range(len(words) - k + 1)]
+    return np.unique(np.fromiter(
+        (zlib.crc32(g.encode("utf-8")) for g in grams),
+        dtype=np.uint64,
+        count=len(grams),
+    ))
+
+
+def minhash(text: str) -> np.ndarray:
+    """Assinatura MinHash (NUM_PERM valores) do texto."""
+    x = shingles(text) & _MERSENNE
+    # (a*x + b) mod p para todas as permutações de uma vez -> matriz NUM_PERM x n
+    hv = (np.outer(_PERM_A, x) + _PERM_B[:, None]) % _MERSENNE
+    return hv.min(axis=1)
+
+
+def similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """Jaccard estimado: fração de posições iguais nas assinaturas."""
+    return float(np.mean(sig_a == sig_b))
+
+
+def _lsh_keys(sig: np.ndarray, bands: int = BANDS):
+    rows = len(sig) // bands
+    for b in range(bands):
+        yield b, sig[b * rows:(b + 1) * rows].tobytes()
+
+
+def dedup_chunks(
+    texts: Sequence[str],
+    urls: Sequence[Sequence[str]],
+    threshold: float = DUP_THRESHOLD,
+) -> Tuple[List[str], List[List[str]], Dict[str, int]]:
+    """
+    Colapsa chunks quase duplicados.
+
+    - texts[i] é o chunk e urls[i] a lista de URLs de origem dele.
+    - O canônico de cada grupo é o primeiro chunk que aparece (ordem estável);
+      ele herda as URLs de todos os membros do grupo, sem repetição.
+
+    Retorna (textos, urls, stats) com stats = {"before", "after", "removed"}.
+    """
+    sigs = [minhash(t) for t in texts]
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    buckets: Dict[Tuple[int, bytes], List[int]] = {}
+    for i, sig in enumerate(sigs):
+        for key in _lsh_keys(sig):
+            for j in buckets.setdefault(key, []):
+                ri, rj = find(i), find(j)
+                if ri != rj and similarity(sigs[i], sigs[j]) >= threshold:
+                    # mantém o menor índice como raiz -> canônico = primeiro visto
+                    parent[max(ri, rj)] = min(ri, rj)
+            buckets[key].append(i)
+
+    out_texts: List[str] = []
+    out_urls: List[List[str]] = []
+    pos: Dict[int, int] = {}
+    for i, t in enumerate(texts):
+        root = find(i)
+        if root not in pos:
+            pos[root] = len(out_texts)
+            out_texts.append(texts[root])
+            out_urls.append([])
+        merged = out_urls[pos[root]]
+        for u in urls[i]:
+            if u not in merged:
+                merged.append(u)
+
+    stats = {
+        "before": len(texts),
+        "after": len(out_texts),
+        "removed": len(texts) - len(out_texts),
+    }
+    return out_texts, out_urls, stats
+
@@ -1,20 +1,30 @@
-import os, json, pathlib, faiss, numpy as np, yaml
+import os, time, logging, pathlib, threading, numpy as np, yaml
+from concurrent.futures import ThreadPoolExecutor, wait
 from sentence_transformers import SentenceTransformer
-from rank_bm25 import BM25Okapi
-from openai import OpenAI
 from dotenv import load_dotenv, dotenv_values
 from .seed_dataset import SEED_DOCS
+from .manifest import MANIFEST_NAME, content_version, read_manifest
+from .answer_bank import AnswerBank
+from .llm import HedgedLLM, backends_from_env
+from .lexical import merge_stats
+from .shards import LIVE_SHARD, Shard, merge_topk, write_shards_manifest
+from .shard_rpc import RemoteShard, ShardVersionChanged
+from .live import WriteAheadLog, document_chunks
+from .profiling import propagate, stage
+from .prompting import PREFIX_CACHE_MIN_TOKENS, PromptTemplate
 
 BASE = pathlib.Path(__file__).resolve().parent
 PROJECT_ROOT = BASE.parent          # raiz do projeto (onde ficam scrape.py e build_index.py)
 ENV_PATH = PROJECT_ROOT / ".env"
 
-IDX_PATH = PROJECT_ROOT / "index/faiss/index.faiss"
-CHUNKS_TEXTS_PATH = PROJECT_ROOT / "data/chunks/texts.jsonl"
-CHUNKS_META_PATH = PROJECT_ROOT / "data/chunks/meta.jsonl"
+SHARDS_DIR = PROJECT_ROOT / "index/shards"   # um subdiretório por fonte (ver app/shards.py)
+SHARDS_MANIFEST = SHARDS_DIR / "manifest.json"
+SEED_SHARD = "seed"
+ANSWER_BANK_PATH = PROJECT_ROOT / "index/answer_bank.sqlite"
+PROFILE_DIR = PROJECT_ROOT / "data/profiles"
+WAL_PATH = PROJECT_ROOT / "data/wal.jsonl"      # mutações do shard live (ver app/live.py)
 
-CHUNKS_TEXTS_PATH.parent.mkdir(parents=True, exist_ok=True)
-IDX_PATH.parent.mkdir(parents=True, exist_ok=True)
+SHARDS_DIR.mkdir(parents=True, exist_ok=True)
 
 load_dotenv(ENV_PATH)
 env_file = {}
@@ -38,6 +48,43 @@ OPENAI_API_KEY = _get_env("OPENAI_API_KEY")
 OPENAI_BASE_URL = _get_env("OPENAI_BASE_URL", "https://api.openai.com/v1")
 OPENAI_MODEL = _get_env("OPENAI_MODEL", "gpt-3.5-turbo")
 EMBED_MODEL  = _get_env("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+SHARD_SEARCH_WORKERS = int(_get_env("SHARD_SEARCH_WORKERS", "8"))
+ADMIN_API_KEY = _get_env("ADMIN_API_KEY")
+LIVE_COMPACT_SECS = float(_get_env("LIVE_COMPACT_SECS", "300"))   # 0 = só compacta via /admin
+
+# modo coordenador: shards servidos por scripts/shard_server.py, ex.:
+# SHARD_SERVERS=cloudwalk=http://127.0.0.1:9101,blog=http://127.0.0.1:9102
+SHARD_SERVERS = dict(
+    item.strip().split("=", 1)
+    for item in (_get_env("SHARD_SERVERS") or "").split(",") if "=" in item
+)
+SHARD_TIMEOUT_SECS = float(_get_env("SHARD_TIMEOUT_SECS", "1.0"))   # por shard remoto e por chamada
+REMOTE_VERSION_CHECK_SECS = float(_get_env("REMOTE_VERSION_CHECK_SECS", "5"))   # idade máx. da versão remota vista
+PROFILE_SAMPLE_RATE = float(_get_env("PROFILE_SAMPLE_RATE", "0"))   # fração do /chat perfilada ao acaso
+PROFILE_KEEP = int(_get_env("PROFILE_KEEP", "200"))   # profiles mantidos em data/profiles (os mais antigos saem)
+
+# LLM: lista ordenada de backends OpenAI-compatíveis (JSON). Ex.:
+# LLM_BACKENDS=[{"name":"openai","base_url":"https://api.openai.com/v1","model":"gpt-4o-mini","api_key":"..."},
+#               {"name":"ollama","base_url":"http://127.0.0.1:11434/v1","model":"llama3.2","api_key":"ollama"}]
+LLM_BACKENDS = _get_env("LLM_BACKENDS")
+LLM_TIMEOUT_SECS = float(_get_env("LLM_TIMEOUT_SECS", "90"))
+LLM_HEDGE_DELAY_SECS = float(_get_env("LLM_HEDGE_DELAY_SECS", "3"))     # antes de ter amostras de p95
+LLM_HEDGE_MIN_SECS = float(_get_env("LLM_HEDGE_MIN_SECS", "0.5"))
+LLM_SLOW_TTFT_SECS = float(_get_env("LLM_SLOW_TTFT_SECS", "20"))        # acima disso conta como falha
+LLM_BREAKER_FAILURES = int(_get_env("LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_COOLDOWN_SECS = float(_get_env("LLM_BREAKER_COOLDOWN_SECS", "30"))
+LLM_MAX_CONCURRENCY = int(_get_env("LLM_MAX_CONCURRENCY", "8"))             # chamadas simultâneas ao LLM
+LLM_ADMISSION_WAIT_SECS = float(_get_env("LLM_ADMISSION_WAIT_SECS", "2"))   # espera máxima por uma vaga
+EXTRACTIVE_MIN_CONFIDENCE = float(_get_env("EXTRACTIVE_MIN_CONFIDENCE", "0.8"))
+EXTRACTIVE_MIN_RETRIEVAL_SCORE = float(_get_env("EXTRACTIVE_MIN_RETRIEVAL_SCORE", "0.5"))   # score fundido do 1º hit
+
+# fusão FAISS + BM25 no retrieve() (ver app/fusion.py)
+FUSION_METHOD = _get_env("FUSION_METHOD", "weighted")          # weighted | rrf
+FUSION_DENSE_WEIGHT = float(_get_env("FUSION_DENSE_WEIGHT", "0.6"))
+RETRIEVE_OVERFETCH = int(_get_env("RETRIEVE_OVERFETCH", "4"))   # candidatos = k * isto, por retriever
+
+ANSWER_BANK_MIN_SIM = float(_get_env("ANSWER_BANK_MIN_SIM", "0.95"))
+ANSWER_BANK_AUTO_REFRESH = _get_env("ANSWER_BANK_AUTO_REFRESH", "1").strip() != "0"
 
 print(f"[ENV] .env path={ENV_PATH} exists={ENV_PATH.exists()} has_key={'yes' if bool(OPENAI_API_KEY) else 'no'}")
 
@@ -52,7 +99,7 @@ BUILD_INDEX_SCRIPT = SCRIPTS_DIR / "build_index.py"
 def ensure_full_index_built():
     """
     Garante que o índice 'grande' (com scraping) exista.
-    - Se index.faiss + texts/meta.jsonl já existem: não faz nada.
+    - Se index/shards/manifest.json já existe: não faz nada.
     - Se não existem:
         * Se scrape.py e build_index.py existirem -> executa os dois.
         * Se der erro, segue com índice mínimo de SEED_DOCS no __init__ do Store.
@@ -60,10 +107,14 @@ def ensure_full_index_built():
         - BUILD_INDEX_ON_START=0  -> não roda scripts, usa só SEED_DOCS.
         - Se não definir ou for diferente de 0 -> tenta rodar scripts.
     """
-    if IDX_PATH.exists() and CHUNKS_TEXTS_PATH.exists() and CHUNKS_META_PATH.exists():
+    if SHARDS_MANIFEST.exists():
         print("[INIT] Índice completo já existe em disco; não vou rodar scrape/build_index.")
         return
 
+    if SHARD_SERVERS:
+        print("[INIT] Modo coordenador (SHARD_SERVERS): o índice fica nos shard servers.")
+        return
+
     flag = os.getenv("BUILD_INDEX_ON_START", "1").strip()
     if flag == "0":
         print("[INIT] BUILD_INDEX_ON_START=0 -> não vou rodar scrape/build_index. Usando apenas SEED_DOCS.")
@@ -96,94 +147,427 @@ def ensure_full_index_built():
 
 
 class Store:
-    def __init__(self):
+    def __init__(self, shards_dir: pathlib.Path = SHARDS_DIR, wal_path: pathlib.Path = WAL_PATH):
+        # por padrão, index/shards e data/wal.jsonl; outro par só para checagens isoladas
+        # (scripts/check_search.py), que não podem disputar o WAL com a API
+        self.shards_dir = pathlib.Path(shards_dir)
         # Embedder (usado tanto para índice de disco quanto para SEED_DOCS extras)
         self.embedder = SentenceTransformer(EMBED_MODEL)
 
         # 0) tenta construir o índice completo (scraping) se ainda não existir
         ensure_full_index_built()
 
-        # 1) Primeiro tenta carregar um índice existente (scrape + build_index)
-        if IDX_PATH.exists() and CHUNKS_TEXTS_PATH.exists() and CHUNKS_META_PATH.exists():
-            print("[INIT] Carregando índice existente de disco (scrape/build_index)...")
-            self.index = faiss.read_index(str(IDX_PATH))
-            self.texts = [
-                json.loads(l)["text"]
-                for l in open(CHUNKS_TEXTS_PATH, encoding="utf-8")
-            ]
-            self.meta = [
-                json.loads(l)["url"]
-                for l in open(CHUNKS_META_PATH, encoding="utf-8")
-            ]
+        # shards: nome -> Shard. O dict é trocado inteiro (copy-on-write) quando
+        # um shard é recarregado, então buscas em andamento não veem meio-estado.
+        self.shards: dict[str, Shard] = {}
+        self._shards_lock = threading.Lock()
+        # FAISS libera o GIL durante a busca, então threads bastam para o fan-out
+        self._pool = ThreadPoolExecutor(max_workers=SHARD_SEARCH_WORKERS, thread_name_prefix="shard")
+        self._manifest_version = None
+        self._remote_checked_at = time.monotonic()
+        # chamado quando um shard remoto muda de versão (main.py: regenera o banco de respostas)
+        self.on_remote_change = None
+
+        # 0b) Modo coordenador: shards remotos (cada um em um scripts/shard_server.py)
+        for name, url in SHARD_SERVERS.items():
+            self.shards[name] = RemoteShard(name, url, timeout=SHARD_TIMEOUT_SECS)
+            print(f"[INIT] Shard {name}: remoto em {url} ({len(self.shards[name])} chunks).")
+
+        # 1) Primeiro tenta carregar os shards existentes (scrape + build_index)
+        if (self.shards_dir / MANIFEST_NAME).exists():
+            print("[INIT] Carregando shards de disco (scrape/build_index)...")
+            manifest = read_manifest(self.shards_dir)
+            self._manifest_version = manifest.get("version")
+            for name in manifest.get("shards", {}):
+                if name in SHARD_SERVERS:
+                    continue
+                self.shards[name] = Shard.load(name, self.shards_dir / name, mutable=(name == LIVE_SHARD))
+                print(f"[INIT] Shard {name}: {len(self.shards[name])} chunks.")
         else:
             # 2) Se não existir índice, cria um índice mínimo só com SEED_DOCS
             print("[INIT] Nenhum índice encontrado. Construindo índice mínimo com SEED_DOCS...")
-            self.texts = [doc["text"] for doc in SEED_DOCS]
-            self.meta = [doc["url"] for doc in SEED_DOCS]
-
-            embs = self.embedder.encode(
-                self.texts,
-                convert_to_numpy=True,
-                normalize_embeddings=True,
-            ).astype(np.float32)
-
-            self.index = faiss.IndexFlatIP(embs.shape[1])
-            self.index.add(embs)
+            seed = self._build_shard(
+                SEED_SHARD,
+                [doc["text"] for doc in SEED_DOCS],
+                [[doc["url"]] for doc in SEED_DOCS],
+            )
+            self.shards[SEED_SHARD] = seed
 
             # salva esse índice mínimo para próximas execuções
-            faiss.write_index(self.index, str(IDX_PATH))
-            CHUNKS_TEXTS_PATH.write_text(
-                "\n".join(json.dumps({"text": t}) for t in self.texts),
-                encoding="utf-8",
-            )
-            CHUNKS_META_PATH.write_text(
-                "\n".join(json.dumps({"url": u}) for u in self.meta),
-                encoding="utf-8",
+            seed.save(self.shards_dir / SEED_SHARD, embed_model=EMBED_MODEL)
+            self._manifest_version = write_shards_manifest(
+                self.shards_dir, {SEED_SHARD: seed.version}, embed_model=EMBED_MODEL
             )
             print("[INIT] Índice mínimo criado e salvo.")
 
         # 3) Agora, independente da origem, garantimos que os SEED_DOCS também estão presentes
-        existing_urls = {str(u) for u in self.meta}
-        extra_texts = []
-        extra_meta = []
-
-        for doc in SEED_DOCS:
-            if doc["url"] not in existing_urls:
-                extra_texts.append(doc["text"])
-                extra_meta.append(doc["url"])
-
-        if extra_texts:
-            print(f"[INIT] Injetando {len(extra_texts)} SEED_DOCS extras no índice...")
-            extra_embs = self.embedder.encode(
-                extra_texts,
-                convert_to_numpy=True,
-                normalize_embeddings=True,
-            ).astype(np.float32)
-
-            self.index.add(extra_embs)
-            self.texts.extend(extra_texts)
-            self.meta.extend(extra_meta)
-
-        # 4) BM25 em cima de TODOS os textos (scrape + seed)
-        self.bm25 = BM25Okapi([t.split() for t in self.texts])
-
-        # 5) Prompts
+        existing_urls = {str(u) for _, urls in self.iter_chunks(with_sources=True) for u in urls}
+        extra = [doc for doc in SEED_DOCS if doc["url"] not in existing_urls]
+
+        if extra:
+            print(f"[INIT] Injetando {len(extra)} SEED_DOCS extras no índice...")
+            self.add_documents([d["text"] for d in extra], [[d["url"]] for d in extra])
+
+        # 3b) Documentos ingeridos via /admin/documents depois da última compactação
+        self._live_lock = threading.Lock()
+        applied = read_manifest(self.shards_dir / LIVE_SHARD).get("wal_seq", 0) if LIVE_SHARD in self.shards else 0
+        self.wal = WriteAheadLog(wal_path, start_seq=applied)
+        replayed = 0
+        for rec in self.wal.replay(applied):
+            if rec["op"] == "add":
+                chunks = document_chunks(rec["text"])
+                self._apply_upsert(rec["url"], chunks, self.embed_texts(chunks))
+            elif rec["op"] == "delete":
+                self._apply_delete(rec["url"])
+            replayed += 1
+        if replayed:
+            print(f"[INIT] WAL: {replayed} operações reaplicadas no shard {LIVE_SHARD}.")
+
+        # 4) Prompts
         with open(BASE/"prompts.yaml", encoding="utf-8") as f:
             p = yaml.safe_load(f)
         self.system = p["system"]
         self.styles = p["styles"]
+        self.prompt = PromptTemplate.from_config(p)
+        fixed = self.prompt.prefix_tokens()
+        if fixed < PREFIX_CACHE_MIN_TOKENS:
+            print(f"[INIT] Prompt v{self.prompt.version}: prefixo fixo ~{fixed} tokens, abaixo do mínimo de "
+                  f"{PREFIX_CACHE_MIN_TOKENS} do cache automático da OpenAI (cached_tokens tende a ficar em 0).")
+
+        # 5) Cliente LLM (um ou mais backends OpenAI-compatíveis, com hedging)
+        self.llm = HedgedLLM(
+            backends_from_env(
+                LLM_BACKENDS,
+                {"name": "default", "base_url": OPENAI_BASE_URL, "model": OPENAI_MODEL, "api_key": OPENAI_API_KEY},
+                timeout=LLM_TIMEOUT_SECS,
+                failure_threshold=LLM_BREAKER_FAILURES,
+                cooldown_secs=LLM_BREAKER_COOLDOWN_SECS,
+            ),
+            hedge_default_secs=LLM_HEDGE_DELAY_SECS,
+            hedge_min_secs=LLM_HEDGE_MIN_SECS,
+            slow_ttft_secs=LLM_SLOW_TTFT_SECS,
+        )
+        self.model = self.llm.model
+        print("[INIT] Backends LLM:", ", ".join(f"{b.name}({b.model})" for b in self.llm.backends))
 
-        # 6) Cliente OpenAI
-        self.llm = OpenAI(base_url=OPENAI_BASE_URL, api_key=OPENAI_API_KEY)
-        self.model = OPENAI_MODEL
+        # 6) Banco de respostas pré-computadas (scripts/build_answer_bank.py)
+        self.answer_bank = AnswerBank(ANSWER_BANK_PATH, min_similarity=ANSWER_BANK_MIN_SIM)
+        print(f"[INIT] Banco de respostas: {len(self.answer_bank)} entradas.")
 
-    def embed(self, q: str):
+    # ---------- embeddings ----------
+
+    def embed_texts(self, texts):
         return (
             self.embedder
-            .encode([q], convert_to_numpy=True, normalize_embeddings=True)
+            .encode(list(texts), convert_to_numpy=True, normalize_embeddings=True)
             .astype(np.float32)
         )
 
+    def embed(self, q: str):
+        return self.embed_texts([q])
+
+    # ---------- shards ----------
+
+    def _build_shard(self, name, texts, sources):
+        """Shard em memória (mutável), usado para SEED_DOCS e conteúdo de runtime."""
+        return Shard.from_embeddings(
+            name, texts, sources, self.embed_texts(texts),
+            dim=self.embedder.get_sentence_embedding_dimension(), mutable=True,
+        )
+
+    def add_documents(self, texts, sources, shard: str = SEED_SHARD):
+        """Acrescenta chunks a um shard mutável (cria o shard se preciso)."""
+        texts, sources = list(texts), [list(u) for u in sources]
+        with self._shards_lock:
+            sh = self.shards.get(shard)
+            if sh is None or not sh.mutable:
+                # shard novo, ou shard de disco promovido para uma cópia mutável em memória
+                if sh is not None:
+                    texts, sources = sh.texts + texts, sh.sources + sources
+                self.shards = {**self.shards, shard: self._build_shard(shard, texts, sources)}
+                return
+        sh.add(texts, sources, self.embed_texts(texts))
+
+    # ---------- ingestão em runtime (shard live + WAL) ----------
+
+    def _live(self) -> Shard:
+        sh = self.shards.get(LIVE_SHARD)
+        if sh is None:
+            dim = self.embedder.get_sentence_embedding_dimension()
+            sh = Shard.from_embeddings(LIVE_SHARD, [], [], np.empty((0, dim), dtype=np.float32),
+                                       dim=dim, mutable=True)
+            with self._shards_lock:
+                self.shards = {**self.shards, LIVE_SHARD: sh}
+        return sh
+
+    def _apply_upsert(self, url, chunks, embs):
+        sh = self._live()
+        sh.remove(sh.url_ids(url))
+        sh.add(chunks, [[url]] * len(chunks), embs)
+
+    def _apply_delete(self, url) -> int:
+        sh = self.shards.get(LIVE_SHARD)
+        ids = sh.url_ids(url) if sh is not None else []
+        if ids:
+            sh.remove(ids)
+        return len(ids)
+
+    def upsert_document(self, url: str, text: str) -> int:
+        """
+        Indexa (ou substitui) um documento no shard live; fica buscável ao
+        retornar. A operação vai para o WAL antes de ser aplicada. Retorna o
+        número de chunks.
+        """
+        chunks = document_chunks(text)
+        if not chunks:
+            raise ValueError("documento sem texto")
+        embs = self.embed_texts(chunks)
+        with self._live_lock:
+            self.wal.append("add", url=url, text=text)
+            self._apply_upsert(url, chunks, embs)
+        return len(chunks)
+
+    def delete_document(self, url: str) -> int:
+        """Remove do shard live os chunks do documento. Retorna quantos foram removidos."""
+        with self._live_lock:
+            sh = self.shards.get(LIVE_SHARD)
+            if sh is None or not sh.url_ids(url):
+                return 0
+            self.wal.append("delete", url=url)
+            return self._apply_delete(url)
+
+    def compact_live(self) -> bool:
+        """
+        Grava o shard live em disco sem os chunks removidos, atualiza o
+        manifest e trunca o WAL. Retorna False se não havia nada a compactar.
+        """
+        with self._live_lock:
+            sh = self.shards.get(LIVE_SHARD)
+            if sh is None or self.wal.pending == 0:
+                return False
+            keep = sh.alive_ids()
+            dim = self.embedder.get_sentence_embedding_dimension()
+            embs = (
+                sh.index.reconstruct_n(0, sh.index.ntotal)[keep]
+                if keep else np.empty((0, dim), dtype=np.float32)
+            )
+            new = Shard.from_embeddings(
+                LIVE_SHARD, [sh.texts[i] for i in keep], [sh.sources[i] for i in keep],
+                embs, dim=dim, mutable=True,
+            )
+            new.save(self.shards_dir / LIVE_SHARD, embed_model=EMBED_MODEL, wal_seq=self.wal.seq)
+            versions = dict(read_manifest(self.shards_dir).get("shards", {}))
+            versions[LIVE_SHARD] = new.version
+            with self._shards_lock:
+                self._manifest_version = write_shards_manifest(self.shards_dir, versions, embed_model=EMBED_MODEL)
+                self.shards = {**self.shards, LIVE_SHARD: new}
+            self.wal.truncate()
+        print(f"[LIVE] Shard {LIVE_SHARD} compactado: {len(new)} chunks (versão {new.version}).")
+        return True
+
+    def reload_shard(self, name: str):
+        """Relê um shard do disco (após build_index.py --shard <name>)."""
+        if name == LIVE_SHARD:
+            raise ValueError(f"o shard '{LIVE_SHARD}' é mantido pelo WAL; use /admin/live/compact")
+        remote = self.shards.get(name)
+        if isinstance(remote, RemoteShard):
+            # o shard server relê o próprio disco; o RemoteShard antigo fica com a versão velha
+            sh = remote.renewed(reload=True)
+            with self._shards_lock:
+                self.shards = {**self.shards, name: sh}
+            print(f"[SHARD] {name} recarregado no servidor remoto: {len(sh)} chunks (versão {sh.version}).")
+            return sh
+        manifest = read_manifest(self.shards_dir)
+        if name not in manifest.get("shards", {}):
+            raise KeyError(name)
+        sh = Shard.load(name, self.shards_dir / name)
+        with self._shards_lock:
+            self.shards = {**self.shards, name: sh}
+            self._manifest_version = manifest.get("version")
+        print(f"[SHARD] {name} recarregado: {len(sh)} chunks (versão {sh.version}).")
+        return sh
+
+    def reload_shards(self):
+        """Recarrega só os shards cuja versão em disco mudou. Retorna os nomes."""
+        manifest = read_manifest(self.shards_dir)
+        on_disk = manifest.get("shards", {})
+        changed = [
+            n for n, v in on_disk.items()
+            if n != LIVE_SHARD and n not in SHARD_SERVERS
+            and (n not in self.shards or self.shards[n].version != v)
+        ]
+        for name in changed:
+            self.reload_shard(name)
+        removed = [
+            n for n, sh in self.shards.items()
+            if n not in on_disk and not sh.mutable and not isinstance(sh, RemoteShard)
+        ]
+        if removed:
+            with self._shards_lock:
+                self.shards = {n: sh for n, sh in self.shards.items() if n not in removed}
+        return changed + removed
+
+    @property
+    def index_version(self):
+        """
+        Versão do que está indexado: a do manifest local combinada com a de
+        cada shard remoto, então um reload num shard server também invalida o
+        banco de respostas. As versões remotas são conferidas (GET /info) no
+        máximo a cada REMOTE_VERSION_CHECK_SECS.
+        """
+        if not any(isinstance(sh, RemoteShard) for sh in self.shards.values()):
+            return self._manifest_version
+        self._sync_remote_versions()
+        remote = sorted((n, sh.version or "") for n, sh in self.shards.items() if isinstance(sh, RemoteShard))
+        return content_version(
+            [self._manifest_version or ""] + [v for _, v in remote], ["manifest"] + [n for n, _ in remote],
+        )
+
+    def _sync_remote_versions(self):
+        now = time.monotonic()
+        if now - self._remote_checked_at < REMOTE_VERSION_CHECK_SECS:
+            return
+        self._remote_checked_at = now
+        remotes = {n: sh for n, sh in self.shards.items() if isinstance(sh, RemoteShard)}
+        futs = {n: self._pool.submit(sh.refresh_info) for n, sh in remotes.items()}
+        changed = []
+        for n, fut in futs.items():
+            try:
+                fut.result()
+            except ShardVersionChanged:
+                changed.append(n)
+            except Exception as e:
+                logging.warning("[SHARD] %s: sem /info: %s: %s", n, type(e).__name__, e)
+        self._renew_remotes(changed)
+
+    def _renew_remotes(self, names):
+        """Troca os RemoteShards de versão vencida pelos da versão atual (copy-on-write)."""
+        fresh = {}
+        for n in names:
+            old = self.shards.get(n)
+            if isinstance(old, RemoteShard):
+                fresh[n] = (old, old.renewed())
+        with self._shards_lock:
+            # outra thread pode ter renovado antes: só troca se ainda é o objeto antigo
+            self.shards = {
+                **self.shards,
+                **{n: new for n, (old, new) in fresh.items() if self.shards.get(n) is old},
+            }
+        for n, (old, new) in fresh.items():
+            print(f"[SHARD] {n}: servidor remoto mudou de versão ({old.version} -> {new.version}).")
+        if fresh and self.on_remote_change:
+            self.on_remote_change()
+
+    def _corpus_stats(self, snapshot, tokens):
+        """
+        Estatísticas do BM25 somadas sobre todos os shards, pedidas em paralelo
+        -> (TermStats, fora, mudados). Shard que não responde dentro de
+        SHARD_TIMEOUT_SECS (ou falha) vai para fora; o que mudou de versão, para
+        mudados.
+        """
+        futs = {n: self._pool.submit(propagate(sh.term_stats), tokens) for n, sh in snapshot.items()}
+        done, _ = wait(futs.values(), timeout=SHARD_TIMEOUT_SECS)
+        parts, out, changed = [], [], []
+        for n, fut in futs.items():
+            e = fut.exception() if fut in done else TimeoutError(f"sem resposta em {SHARD_TIMEOUT_SECS}s")
+            if e is None:
+                parts.append(fut.result())
+            elif isinstance(e, ShardVersionChanged):
+                changed.append(n)
+            else:
+                out.append(n)
+                logging.warning("[SHARD] %s: sem estatísticas do BM25; fora da busca: %s: %s", n, type(e).__name__, e)
+        return merge_stats(parts), out, changed
+
+    def search(self, q_emb, tokens, k: int, shards=None):
+        """
+        Busca vetorial + BM25 em paralelo nos shards pedidos (todos, por padrão)
+        e junta o top-k global de cada uma -> (densos, lexicais), listas de
+        (score, Shard, id_local). O BM25 de todos os shards usa as estatísticas
+        do corpus inteiro, então os scores lexicais são comparáveis entre eles.
+        Shard remoto que falhar ou estourar SHARD_TIMEOUT_SECS (nas estatísticas
+        ou na busca) fica de fora (resultado parcial); shard remoto que mudou de
+        versão é renovado e a busca roda de novo, uma vez.
+        """
+        for retry in (False, True):
+            snapshot = self.shards
+            with stage("bm25_stats"):
+                stats, out, changed = self._corpus_stats(snapshot, tokens)
+            if changed and not retry:
+                self._renew_remotes(changed)
+                continue
+            names = [n for n in (shards or snapshot) if n in snapshot and n not in out and n not in changed]
+            futs = {n: self._pool.submit(propagate(snapshot[n].search), q_emb, tokens, k, stats) for n in names}
+            dense, lexical, changed = {}, {}, []
+            for n, fut in futs.items():
+                try:
+                    dense[n], lexical[n] = fut.result()
+                except ShardVersionChanged as e:
+                    changed.append(n)
+                    if retry:
+                        logging.warning("[SHARD] %s mudou de versão de novo; seguindo sem ele: %s", n, e)
+                except Exception as e:
+                    logging.warning("[SHARD] %s sem resposta; seguindo sem ele: %s: %s", n, type(e).__name__, e)
+            if not changed or retry:
+                break
+            self._renew_remotes(changed)
+        return (
+            [(score, snapshot[n], i) for score, n, i in merge_topk(dense, k)],
+            [(score, snapshot[n], i) for score, n, i in merge_topk(lexical, k)],
+        )
+
+    def fetch_docs(self, keys):
+        """
+        (texto, url) de cada (Shard, id_local), buscando em paralelo nos shards
+        remotos; None onde o shard não respondeu ou mudou de versão depois da
+        busca (os ids não valem mais).
+        """
+        groups: dict = {}
+        for pos, (sh, i) in enumerate(keys):
+            groups.setdefault(sh.name, (sh, [], []))
+            groups[sh.name][1].append(pos)
+            groups[sh.name][2].append(i)
+        out = [None] * len(keys)
+        futs = {name: self._pool.submit(propagate(sh.docs), ids) for name, (sh, _, ids) in groups.items()}
+        for name, fut in futs.items():
+            try:
+                for pos, doc in zip(groups[name][1], fut.result()):
+                    out[pos] = doc
+            except ShardVersionChanged as e:
+                logging.warning("[SHARD] %s: recarregado entre a busca e os textos; hits descartados: %s", name, e)
+                self._renew_remotes([name])
+            except Exception as e:
+                logging.warning("[SHARD] %s: falha ao buscar textos: %s: %s", name, type(e).__name__, e)
+        return out
+
+    def chunks_with_url(self, needle: str):
+        """(texto, url) de todos os chunks cuja URL contém needle (locais e remotos)."""
+        out = []
+        for sh in self.shards.values():
+            try:
+                out.extend(sh.find_url(needle))
+            except Exception as e:
+                logging.warning("[SHARD] %s: falha no lookup por URL: %s: %s", sh.name, type(e).__name__, e)
+        return out
+
+    def iter_chunks(self, with_sources: bool = False):
+        """Percorre (texto, url) dos shards locais (ou (texto, [urls]))."""
+        for sh in self.shards.values():
+            if isinstance(sh, RemoteShard):
+                continue
+            items = zip(sh.texts, sh.sources if with_sources else sh.meta)
+            if sh.deleted:
+                items = (it for i, it in enumerate(items) if i not in sh.deleted)
+            yield from items
+
+    @property
+    def texts(self):
+        return [t for t, _ in self.iter_chunks()]
+
+    @property
+    def meta(self):
+        return [u for _, u in self.iter_chunks()]
+
 STORE = None
 def get_store():
     global STORE
@@ -0,0 +1,65 @@
+# app/extractive.py
+"""
+Resposta extrativa (sem LLM): escolhe as frases dos melhores trechos
+recuperados que mais se parecem com a pergunta (cosseno entre embeddings)
+e devolve essas frases com citações [n], no mesmo formato do caminho com LLM.
+
+Usada pelo generate_answer() quando a confiança é alta, quando a fila de
+chamadas ao LLM está cheia ou quando o cliente pede mode="extractive".
+"""
+import re
+from typing import Callable, List, Sequence, Tuple
+
+import numpy as np
+
+from .fusion import Hit
+
+_SENT_SPLIT = re.compile(r"(?<=[.!?;])\s+|\n+")
+MIN_WORDS = 5
+MAX_WORDS = 60
+
+
+def split_sentences(text: str) -> List[str]:
+    out = []
+    for s in _SENT_SPLIT.split(text):
+        s = s.strip(" -*#\t")
+        n = len(s.split())
+        if MIN_WORDS <= n <= MAX_WORDS:
+            out.append(s)
+    return out
+
+
+def extractive_answer(
+    q_emb: np.ndarray,
+    hits: Sequence[Hit],
+    embed_texts: Callable[[List[str]], np.ndarray],
+    max_hits: int = 3,
+    max_sentences: int = 3,
+) -> Tuple[str, float]:
+    """
+    Monta a resposta com as frases mais próximas da pergunta.
+    Retorna (texto com citações [n], confiança = maior cosseno encontrado).
+    Os números [n] seguem a ordem dos hits, igual ao format_ctx().
+    """
+    cands = []   # (n do hit, posição da frase, frase)
+    for n, hit in enumerate(hits[:max_hits], 1):
+        for pos, sent in enumerate(split_sentences(hit.text)):
+            cands.append((n, pos, sent))
+    if not cands:
+        return "", 0.0
+
+    embs = embed_texts([c[2] for c in cands])
+    sims = embs @ np.asarray(q_emb, dtype=np.float32).reshape(-1)
+    best = np.argsort(-sims)[:max_sentences]
+
+    # mantém a ordem de leitura (hit, posição) entre as frases escolhidas
+    chosen = sorted(best, key=lambda i: (cands[i][0], cands[i][1]))
+    body = " ".join(_cite(cands[i][2], cands[i][0]) for i in chosen)
+    return body, float(sims[best[0]])
+
+
+def _cite(sentence: str, n: int) -> str:
+    """'Frase.' -> 'Frase [n].' (citação antes da pontuação final)."""
+    if sentence[-1] in ".!?;":
+        return f"{sentence[:-1]} [{n}]{sentence[-1]}"
+    return f"{sentence} [{n}]."
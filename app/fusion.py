@@ -0,0 +1,76 @@
+# app/fusion.py
+"""
+Fusão dos resultados vetoriais (FAISS) e léxicos (BM25) do retrieve().
+
+Tudo trabalha com ids de chunk e scores em arrays NumPy; o texto só é lido
+para os hits finais.
+
+- "weighted": cosseno (recortado em [0, 1]) e BM25 normalizado pelo maior
+  score da consulta, somados com pesos w e 1 - w;
+- "rrf": reciprocal rank fusion, w / (c + rank) + (1 - w) / (c + rank),
+  dividido pelo máximo possível para também ficar em [0, 1].
+
+Os boosts por URL (missão, pilares, páginas da CloudWalk) viram priors: cada
+shard guarda uma matriz chunk x prior (prior_matrix) e a pergunta ativa um
+vetor de pesos (query_prior_weights). O boost entra só na ordenação; o score
+devolvido no Hit é o da fusão, para servir de confiança nas etapas seguintes.
+"""
+from typing import NamedTuple, Sequence
+
+import numpy as np
+
+# (trechos da URL, grupos de gatilhos na pergunta - todos os grupos precisam casar, peso)
+URL_PRIORS = [
+    (("cloudwalk.io",), (("cloudwalk",),), 1.0),
+    (("our-mission",), (("cloudwalk",), ("missao", "missão")), 3.0),
+    (("our-pillars", "code-of-ethics"), (("cloudwalk",), ("valor", "pilar")), 2.0),
+]
+
+
+class Hit(NamedTuple):
+    text: str
+    url: str
+    score: float
+
+
+def prior_matrix(sources: Sequence[Sequence[str]]) -> np.ndarray:
+    """
+    Matriz (n_chunks, n_priors) com 1 onde alguma URL do chunk casa com o prior
+    (um chunk deduplicado carrega as URLs de todas as cópias).
+    """
+    rows = [
+        [any(n in str(u) for u in urls for n in needles) for needles, _, _ in URL_PRIORS]
+        for urls in sources
+    ]
+    return np.asarray(rows, dtype=np.float32).reshape(len(rows), len(URL_PRIORS))
+
+
+def query_prior_weights(query: str) -> np.ndarray:
+    q = query.lower()
+    return np.asarray([
+        weight if all(any(t in q for t in group) for group in groups) else 0.0
+        for _, groups, weight in URL_PRIORS
+    ], dtype=np.float32)
+
+
+def fuse(n: int, dense_pos: np.ndarray, dense_scores: np.ndarray,
+         lex_pos: np.ndarray, lex_scores: np.ndarray,
+         method: str = "weighted", dense_weight: float = 0.6, rrf_k: int = 60) -> np.ndarray:
+    """
+    Score fundido dos n candidatos. dense_pos / lex_pos são as posições dos
+    candidatos em cada lista, já em ordem decrescente de score. A lista lexical
+    só deve ter docs com algum termo da pergunta (LexicalIndex.search já corta
+    os de score 0); senão o rrf daria crédito de posição a eles.
+    """
+    w = dense_weight
+    fused = np.zeros(n, dtype=np.float32)
+    if method == "rrf":
+        fused[dense_pos] += w / (rrf_k + 1 + np.arange(len(dense_pos), dtype=np.float32))
+        fused[lex_pos] += (1 - w) / (rrf_k + 1 + np.arange(len(lex_pos), dtype=np.float32))
+        return fused * (rrf_k + 1)
+    fused[dense_pos] += w * np.clip(dense_scores, 0.0, 1.0)
+    lex_scores = np.clip(lex_scores, 0.0, None)   # BM25 negativo não pode tirar pontos do cosseno
+    top = float(lex_scores.max()) if len(lex_scores) else 0.0
+    if top > 0:
+        fused[lex_pos] += (1 - w) * (lex_scores / top)
+    return fused
@@ -0,0 +1,260 @@
+# app/lexical.py
+"""
+Índice léxico BM25 (Okapi) serializável.
+
+Substitui o BM25Okapi do rank_bm25, que re-tokeniza o corpus inteiro e
+recalcula as frequências a cada boot. Aqui o build_index.py gera, ao lado do
+index.faiss, um diretório com:
+
+- vocab.json     -> termos na ordem dos ids
+- df.npy         -> document frequency por termo
+- doc_len.npy    -> tamanho (em tokens) de cada documento
+- indptr.npy     -> postings em formato CSR por termo
+- doc_ids.npy       (doc_ids[indptr[t]:indptr[t+1]] = docs que têm o termo t)
+- tfs.npy           (frequência do termo em cada um desses docs)
+- meta.json      -> versão (a mesma do índice FAISS) e parâmetros
+
+Os .npy são abertos com mmap, então carregar o índice custa milissegundos.
+Documentos adicionados em runtime (ex.: SEED_DOCS) vão para um "delta" em
+memória; IDF e avgdl são recalculados sobre base + delta, de modo que os
+scores são os mesmos de um BM25Okapi construído sobre o corpus completo.
+
+Com vários shards, cada índice tem o próprio N, df e avgdl, e os scores de
+shards diferentes não são comparáveis (num shard pequeno quase todo termo tem
+IDF negativo). Por isso a busca aceita TermStats somadas sobre todos os shards
+(term_stats() + merge_stats()); com elas o IDF é o do corpus inteiro, na forma
+log(1 + (N - df + 0.5) / (df + 0.5)), sempre positiva.
+"""
+import json
+import pathlib
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+K1 = 1.5
+B = 0.75
+EPSILON = 0.25
+
+_ARRAYS = ("df", "doc_len", "indptr", "doc_ids", "tfs")
+
+
+def tokenize(text: str) -> List[str]:
+    """Mesma tokenização usada até aqui no BM25 (split por espaço)."""
+    return text.split()
+
+
+class TermStats(NamedTuple):
+    """Estatísticas de corpus para os termos de uma consulta; somam entre shards."""
+    n_docs: int
+    total_len: float
+    df: Dict[str, int]
+
+
+def merge_stats(parts: Iterable[TermStats]) -> TermStats:
+    n, total, df = 0, 0.0, {}
+    for p in parts:
+        n += p.n_docs
+        total += p.total_len
+        for term, c in p.df.items():
+            df[term] = df.get(term, 0) + c
+    return TermStats(n, total, df)
+
+
+def shared_idf(n_docs: int, df: int) -> float:
+    return float(np.log1p((n_docs - df + 0.5) / (df + 0.5)))
+
+
+class LexicalIndex:
+    def __init__(self, vocab: List[str], df, doc_len, indptr, doc_ids, tfs,
+                 version: str | None = None, k1: float = K1, b: float = B,
+                 epsilon: float = EPSILON):
+        self.version = version
+        self.k1, self.b, self.epsilon = k1, b, epsilon
+
+        # base (possivelmente mmap, somente leitura)
+        self.terms = list(vocab)
+        self.vocab: Dict[str, int] = {t: i for i, t in enumerate(self.terms)}
+        self._base_terms = len(self.terms)
+        self._base_df = df
+        self._base_len = doc_len
+        self._indptr = indptr
+        self._doc_ids = doc_ids
+        self._tfs = tfs
+
+        # delta em memória: term_id -> ([doc_ids], [tfs])
+        self._delta_post: Dict[int, Tuple[List[int], List[int]]] = {}
+        self._delta_len: List[int] = []
+
+        self._refresh_stats()
+
+    # ---------- construção / persistência ----------
+
+    @classmethod
+    def build(cls, corpus: Sequence[Sequence[str]], version: str | None = None) -> "LexicalIndex":
+        """Constrói o índice a partir de documentos já tokenizados."""
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        docs: List[int] = []
+        tfs: List[int] = []
+        doc_len = np.zeros(len(corpus), dtype=np.int32)
+
+        for d, tokens in enumerate(corpus):
+            doc_len[d] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                docs.append(d)
+                tfs.append(tf)
+
+        term_arr = np.asarray(term_ids, dtype=np.int32)
+        order = np.argsort(term_arr, kind="stable")
+        counts = np.bincount(term_arr, minlength=len(vocab))
+
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        return cls(
+            vocab=list(vocab),
+            df=counts.astype(np.int32),
+            doc_len=doc_len,
+            indptr=indptr,
+            doc_ids=np.asarray(docs, dtype=np.int32)[order],
+            tfs=np.asarray(tfs, dtype=np.int32)[order],
+            version=version,
+        )
+
+    def save(self, path: pathlib.Path):
+        """Grava a parte base do índice (o delta em memória não é persistido)."""
+        path = pathlib.Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        (path / "vocab.json").write_text(
+            json.dumps(self.terms[:self._base_terms], ensure_ascii=False),
+            encoding="utf-8",
+        )
+        arrays = {
+            "df": self._base_df, "doc_len": self._base_len, "indptr": self._indptr,
+            "doc_ids": self._doc_ids, "tfs": self._tfs,
+        }
+        for name in _ARRAYS:
+            np.save(path / f"{name}.npy", np.asarray(arrays[name]))
+        (path / "meta.json").write_text(json.dumps({
+            "version": self.version,
+            "n_docs": int(len(self._base_len)),
+            "n_terms": self._base_terms,
+            "k1": self.k1, "b": self.b, "epsilon": self.epsilon,
+        }), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: pathlib.Path, mmap: bool = True) -> "LexicalIndex":
+        path = pathlib.Path(path)
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        vocab = json.loads((path / "vocab.json").read_text(encoding="utf-8"))
+        mode = "r" if mmap else None
+        arrays = {n: np.load(path / f"{n}.npy", mmap_mode=mode) for n in _ARRAYS}
+        return cls(
+            vocab=vocab, version=meta.get("version"),
+            k1=meta.get("k1", K1), b=meta.get("b", B), epsilon=meta.get("epsilon", EPSILON),
+            **arrays,
+        )
+
+    @staticmethod
+    def stored_version(path: pathlib.Path) -> str | None:
+        fp = pathlib.Path(path) / "meta.json"
+        if not fp.exists():
+            return None
+        return json.loads(fp.read_text(encoding="utf-8")).get("version")
+
+    # ---------- atualização em runtime ----------
+
+    def extend(self, corpus: Sequence[Sequence[str]]) -> List[int]:
+        """Adiciona documentos ao delta em memória. Retorna os ids atribuídos."""
+        first = self.n_docs
+        for offset, tokens in enumerate(corpus):
+            d = first + offset
+            self._delta_len.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                t = self.vocab.get(term)
+                if t is None:
+                    t = self.vocab[term] = len(self.terms)
+                    self.terms.append(term)
+                ids, freqs = self._delta_post.setdefault(t, ([], []))
+                ids.append(d)
+                freqs.append(tf)
+        self._refresh_stats()
+        return list(range(first, self.n_docs))
+
+    def _refresh_stats(self):
+        n_terms = len(self.terms)
+        df = np.zeros(n_terms, dtype=np.float64)
+        df[:self._base_terms] = self._base_df
+        for t, (ids, _) in self._delta_post.items():
+            df[t] += len(ids)
+
+        self._doc_len = np.concatenate([
+            np.asarray(self._base_len, dtype=np.float32),
+            np.asarray(self._delta_len, dtype=np.float32),
+        ])
+        self.n_docs = len(self._doc_len)
+        avgdl = float(self._doc_len.mean()) if self.n_docs else 1.0
+
+        # mesma regra do BM25Okapi: idf negativo vira epsilon * idf médio
+        idf = np.log(self.n_docs - df + 0.5) - np.log(df + 0.5) if n_terms else df
+        if n_terms:
+            floor = self.epsilon * float(idf.mean())
+            idf = np.where(idf < 0, floor, idf)
+        self._df = df
+        self._total_len = float(self._doc_len.sum())
+        self._idf = idf.astype(np.float32)
+        self._norm = (self.k1 * (1 - self.b + self.b * self._doc_len / max(avgdl, 1e-9))).astype(np.float32)
+
+    # ---------- busca ----------
+
+    def term_stats(self, terms: Sequence[str]) -> TermStats:
+        """Contribuição deste índice para as estatísticas globais dos termos."""
+        df = {}
+        for term in set(terms):
+            t = self.vocab.get(term)
+            df[term] = int(self._df[t]) if t is not None else 0
+        return TermStats(self.n_docs, self._total_len, df)
+
+    def get_scores(self, query: Sequence[str], stats: TermStats | None = None) -> np.ndarray:
+        """Scores BM25 de todos os docs; com stats, usa IDF e avgdl do corpus inteiro."""
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        if stats is not None:
+            avgdl = stats.total_len / max(stats.n_docs, 1)
+        for term in query:
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            idf = self._idf[t] if stats is None else shared_idf(stats.n_docs, stats.df.get(term, 0))
+            postings = []
+            if t < self._base_terms:
+                lo, hi = self._indptr[t], self._indptr[t + 1]
+                postings.append((self._doc_ids[lo:hi], self._tfs[lo:hi]))
+            if t in self._delta_post:
+                postings.append(self._delta_post[t])
+            for ids, freqs in postings:
+                docs = np.asarray(ids)
+                tf = np.asarray(freqs, dtype=np.float32)
+                if stats is None:
+                    norm = self._norm[docs]
+                else:
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[docs] / max(avgdl, 1e-9))
+                scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: Sequence[str], k: int,
+               stats: TermStats | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k documentos para a query tokenizada -> (ids, scores). Só entram
+        docs com score > 0: sem termo da pergunta, o doc não é um resultado.
+        """
+        scores = self.get_scores(query, stats)
+        k = min(k, self.n_docs)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[scores[top] > 0]
+        return top, scores[top]
+
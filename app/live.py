@@ -0,0 +1,97 @@
+# app/live.py
+"""
+Ingestão em runtime (POST/DELETE /admin/documents).
+
+Documentos novos vão para o shard mutável "live" (FAISS + delta do BM25) e
+ficam buscáveis assim que a requisição termina. Para não se perderem num
+restart, cada mutação é gravada antes num write-ahead log (data/wal.jsonl,
+uma linha JSON por operação, com fsync):
+
+    {"seq": 12, "op": "add",    "url": "...", "text": "...", "ts": ...}
+    {"seq": 13, "op": "delete", "url": "...", "ts": ...}
+
+No boot o Store reaplica as operações com seq maior que o wal_seq gravado no
+manifest do shard live. De tempos em tempos (LIVE_COMPACT_SECS) o shard é
+compactado: os chunks removidos saem de vez, o shard vai para
+index/shards/live/, o manifest global é atualizado e o WAL é truncado.
+"""
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+from typing import Callable, Iterator, List
+
+from .chunking import chunk
+
+
+def document_chunks(text: str) -> List[str]:
+    """Mesmo chunking do build_index.py; documentos curtos viram um chunk só."""
+    chunks = chunk(text)
+    if not chunks:
+        whole = " ".join(text.split())
+        chunks = [whole] if whole else []
+    return chunks
+
+
+class WriteAheadLog:
+    def __init__(self, path: pathlib.Path, start_seq: int = 0):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.seq = start_seq
+        self.pending = 0          # operações desde a última compactação
+        for rec in self.replay(0):
+            self.seq = max(self.seq, rec["seq"])
+            self.pending += 1
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def append(self, op: str, **fields) -> int:
+        self.seq += 1
+        rec = {"seq": self.seq, "op": op, **fields}
+        self._fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self.pending += 1
+        return self.seq
+
+    def replay(self, after_seq: int) -> Iterator[dict]:
+        """Operações com seq > after_seq, na ordem. Uma última linha truncada (crash) é ignorada."""
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning("[LIVE] linha inválida no WAL %s ignorada", self.path)
+                    continue
+                if rec.get("seq", 0) > after_seq:
+                    yield rec
+
+    def truncate(self):
+        """Chamado depois que o shard live foi gravado com wal_seq = self.seq."""
+        self._fh.close()
+        self._fh = open(self.path, "w", encoding="utf-8")
+        os.fsync(self._fh.fileno())
+        self.pending = 0
+
+
+def start_compactor(compact: Callable[[], bool], interval_secs: float,
+                    on_compact: Callable[[], None] | None = None):
+    """Thread de fundo que chama compact() a cada interval_secs (0 = desligado)."""
+    if interval_secs <= 0:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(interval_secs)
+            try:
+                if compact() and on_compact:
+                    on_compact()
+            except Exception:
+                logging.exception("[LIVE] Erro ao compactar o shard live")
+
+    t = threading.Thread(target=loop, name="live-compactor", daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,384 @@
+# app/llm.py
+"""
+Cliente LLM com vários backends OpenAI-compatíveis (ex.: OpenAI + Ollama local).
+
+- Os backends ficam numa lista ordenada (LLM_BACKENDS no .env, em JSON);
+  sem ela, usa o backend único de OPENAI_BASE_URL / OPENAI_MODEL.
+- Requisição "hedged": se o backend principal não produzir o primeiro token
+  dentro de um atraso derivado do p95 do seu TTFT, a mesma requisição vai
+  para o próximo backend. Quem produzir o primeiro token primeiro vence e o
+  outro stream é fechado.
+- Circuit breaker por backend: erros seguidos ou TTFT acima do limite abrem o
+  circuito por um tempo; depois disso uma única requisição de teste decide se
+  ele fecha de novo.
+- stats() exporta latência (TTFT/total, p50/p95), taxa de vitória e tokens
+  de prompt servidos do cache de prefixo do provedor, por backend.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+from openai import OpenAI
+
+from .profiling import propagate
+
+
+def _percentile(values, p: float) -> float | None:
+    if not values:
+        return None
+    vals = sorted(values)
+    idx = min(len(vals) - 1, max(0, int(round(p / 100.0 * (len(vals) - 1)))))
+    return vals[idx]
+
+
+def prompt_cache_usage(usage) -> tuple[int, int]:
+    """(prompt_tokens, cached_tokens) do usage da resposta; 0 se o provedor não informar."""
+    if usage is None:
+        return 0, 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        cached = details.get("cached_tokens")
+    else:
+        cached = getattr(details, "cached_tokens", None)
+    return getattr(usage, "prompt_tokens", 0) or 0, cached or 0
+
+
+class LatencyStats:
+    """Amostras recentes de latência + contadores de um backend."""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self.ttft = deque(maxlen=window)
+        self.total = deque(maxlen=window)
+        self.requests = 0
+        self.wins = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.hedges = 0          # vezes em que este backend entrou como hedge/fallback
+        self.prompt_tokens = 0
+        self.cached_tokens = 0   # tokens de prompt servidos do cache de prefixo do provedor
+
+    def record(self, **counts):
+        with self._lock:
+            for k, v in counts.items():
+                setattr(self, k, getattr(self, k) + v)
+
+    def add_ttft(self, secs: float):
+        with self._lock:
+            self.ttft.append(secs)
+
+    def add_total(self, secs: float):
+        with self._lock:
+            self.total.append(secs)
+
+    def ttft_p95(self, min_samples: int) -> float | None:
+        with self._lock:
+            if len(self.ttft) < min_samples:
+                return None
+            return _percentile(list(self.ttft), 95)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            ttft, total = list(self.ttft), list(self.total)
+            return {
+                "requests": self.requests,
+                "wins": self.wins,
+                "win_rate": round(self.wins / self.requests, 4) if self.requests else None,
+                "errors": self.errors,
+                "cancelled": self.cancelled,
+                "hedges": self.hedges,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "prompt_cache_hit_rate": (
+                    round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else None
+                ),
+                "ttft_p50": _percentile(ttft, 50),
+                "ttft_p95": _percentile(ttft, 95),
+                "total_p50": _percentile(total, 50),
+                "total_p95": _percentile(total, 95),
+            }
+
+
+class CircuitBreaker:
+    """closed -> (falhas seguidas) -> open -> (cooldown) -> half_open -> closed/open."""
+
+    def __init__(self, failure_threshold: int = 3, cooldown_secs: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown_secs = cooldown_secs
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown_secs:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def release(self):
+        """Chamada cancelada (perdeu o hedge): não conta como sucesso nem falha."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class Backend:
+    def __init__(self, name: str, base_url: str, model: str, api_key: str | None,
+                 timeout: float, stream_usage: bool = True,
+                 failure_threshold: int = 3, cooldown_secs: float = 30.0):
+        self.name = name
+        self.model = model
+        self.base_url = base_url
+        # sem retries do SDK: quem decide repetir/desviar é o hedging
+        self.client = OpenAI(base_url=base_url, api_key=api_key or "none",
+                             timeout=timeout, max_retries=0)
+        self.stream_usage = stream_usage
+        self.stats = LatencyStats()
+        self.breaker = CircuitBreaker(failure_threshold, cooldown_secs)
+
+
+class LLMResult:
+    def __init__(self, text: str, backend: str, model: str, usage=None,
+                 ttft: float | None = None, latency: float | None = None):
+        self.text = text
+        self.backend = backend
+        self.model = model
+        self.usage = usage
+        self.ttft = ttft
+        self.latency = latency
+
+
+class _Attempt(threading.Thread):
+    """Uma chamada em streaming para um backend, reportando eventos numa fila."""
+
+    def __init__(self, backend: Backend, messages, params: dict, events: queue.Queue):
+        super().__init__(name=f"llm-{backend.name}", daemon=True)
+        self.backend = backend
+        self.messages = messages
+        self.params = params
+        self.events = events
+        self.cancelled = threading.Event()
+        self.started_at = time.monotonic()
+        self.ttft: float | None = None
+        self._stream = None
+        self._call = propagate(self._run)   # criado na thread que dispara: herda o profile dela
+
+    def cancel(self):
+        self.cancelled.set()
+        stream = self._stream
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+    def run(self):
+        self._call()
+
+    def _run(self):
+        b = self.backend
+        extra = {"stream_options": {"include_usage": True}} if b.stream_usage else {}
+        parts, usage, first = [], None, False
+        try:
+            self._stream = b.client.chat.completions.create(
+                model=b.model, messages=self.messages, stream=True, **self.params, **extra,
+            )
+            for chunk in self._stream:
+                if self.cancelled.is_set():
+                    break
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not first:
+                        first = True
+                        self.events.put(("first_token", self, time.monotonic() - self.started_at))
+                    parts.append(delta)
+            if self.cancelled.is_set():
+                return
+            self.events.put(("done", self, ("".join(parts), usage)))
+        except Exception as e:
+            if not self.cancelled.is_set():
+                self.events.put(("error", self, e))
+
+
+class HedgedLLM:
+    def __init__(self, backends, hedge_default_secs: float = 3.0, hedge_min_secs: float = 0.5,
+                 hedge_min_samples: int = 20, slow_ttft_secs: float = 20.0):
+        if not backends:
+            raise ValueError("HedgedLLM precisa de pelo menos um backend")
+        self.backends = list(backends)
+        self.hedge_default_secs = hedge_default_secs
+        self.hedge_min_secs = hedge_min_secs
+        self.hedge_min_samples = hedge_min_samples
+        self.slow_ttft_secs = slow_ttft_secs
+
+    @property
+    def model(self) -> str:
+        return self.backends[0].model
+
+    def hedge_delay(self, backend: Backend) -> float:
+        p95 = backend.stats.ttft_p95(self.hedge_min_samples)
+        if p95 is None:
+            return self.hedge_default_secs
+        return max(self.hedge_min_secs, p95)
+
+    def complete(self, messages, timeout: float, **params) -> LLMResult:
+        """Gera a resposta com hedging entre backends. Levanta TimeoutError ou o último erro."""
+        events: queue.Queue = queue.Queue()
+        # o breaker só é consultado na hora de disparar (allow() reserva o probe do half_open)
+        pending = iter(self.backends)
+        running: list[_Attempt] = []
+        winner: _Attempt | None = None
+        last_error: Exception | None = None
+        start = time.monotonic()
+        deadline = start + timeout
+
+        def launch(hedge: bool = False, force: Backend | None = None) -> bool:
+            b = force or next((c for c in pending if c.breaker.allow()), None)
+            if b is None:
+                return False
+            b.stats.record(requests=1, hedges=1 if hedge else 0)
+            att = _Attempt(b, messages, params, events)
+            running.append(att)
+            att.start()
+            return True
+
+        def cancel_others(keep):
+            for att in running:
+                if att is not keep and not att.cancelled.is_set():
+                    att.cancel()
+                    att.backend.stats.record(cancelled=1)
+                    att.backend.breaker.release()
+
+        if not launch():
+            # todos com circuito aberto: melhor tentar o principal do que falhar sem tentar
+            launch(force=self.backends[0])
+        hedge_at = start + self.hedge_delay(running[0].backend)
+        can_hedge = True
+
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                for att in running:
+                    if not att.cancelled.is_set():
+                        att.backend.stats.record(errors=1)
+                        att.backend.breaker.failure()
+                        att.cancel()
+                raise TimeoutError(f"LLM sem resposta em {timeout}s")
+
+            waiting_hedge = winner is None and can_hedge
+            wait = min(deadline, hedge_at) - now if waiting_hedge else deadline - now
+            try:
+                kind, att, payload = events.get(timeout=max(wait, 0.0))
+            except queue.Empty:
+                if waiting_hedge and time.monotonic() >= hedge_at:
+                    can_hedge = launch(hedge=True)
+                    if can_hedge:
+                        logging.info("LLM: hedge para %s após %.2fs", running[-1].backend.name,
+                                     hedge_at - start)
+                        hedge_at = time.monotonic() + self.hedge_delay(running[-1].backend)
+                continue
+
+            b = att.backend
+            if att.cancelled.is_set():
+                continue
+
+            if kind == "first_token":
+                att.ttft = payload
+                b.stats.add_ttft(payload)
+                if payload > self.slow_ttft_secs:
+                    b.breaker.failure()   # pico de latência conta como falha
+                if winner is None:
+                    winner = att
+                    cancel_others(att)
+
+            elif kind == "done":
+                if winner is not None and att is not winner:
+                    continue
+                text, usage = payload
+                latency = time.monotonic() - att.started_at
+                b.stats.add_total(latency)
+                prompt_tokens, cached_tokens = prompt_cache_usage(usage)
+                b.stats.record(wins=1, prompt_tokens=prompt_tokens, cached_tokens=cached_tokens)
+                if att.ttft is None or att.ttft <= self.slow_ttft_secs:
+                    b.breaker.success()
+                cancel_others(att)
+                return LLMResult(text, b.name, b.model, usage, att.ttft, latency)
+
+            elif kind == "error":
+                logging.warning("LLM: erro no backend %s: %s: %s", b.name, type(payload).__name__, payload)
+                b.stats.record(errors=1)
+                b.breaker.failure()
+                last_error = payload
+                att.cancelled.set()
+                if winner is att:
+                    winner = None
+                alive = [a for a in running if not a.cancelled.is_set()]
+                if not alive:
+                    # fallback imediato para o próximo backend da lista
+                    if not launch(hedge=True):
+                        raise last_error
+                    hedge_at = time.monotonic() + self.hedge_delay(running[-1].backend)
+
+    def stats(self) -> dict:
+        return {
+            b.name: {
+                "model": b.model,
+                "base_url": b.base_url,
+                "circuit": b.breaker.state,
+                **b.stats.snapshot(),
+            }
+            for b in self.backends
+        }
+
+
+def backends_from_env(raw: str | None, default: dict, timeout: float, **breaker) -> list[Backend]:
+    """
+    Lê LLM_BACKENDS (lista JSON de {name, base_url, model, api_key, stream_usage}).
+    Sem a variável, usa só o backend padrão (OPENAI_BASE_URL / OPENAI_MODEL).
+    """
+    specs = [default]
+    if raw:
+        try:
+            specs = json.loads(raw)
+        except Exception:
+            logging.exception("LLM_BACKENDS inválido; usando só o backend padrão")
+    out = []
+    for i, spec in enumerate(specs):
+        out.append(Backend(
+            name=spec.get("name") or f"backend{i}",
+            base_url=spec.get("base_url") or default["base_url"],
+            model=spec.get("model") or default["model"],
+            api_key=spec.get("api_key") or default.get("api_key"),
+            timeout=timeout,
+            stream_usage=spec.get("stream_usage", True),
+            **breaker,
+        ))
+    return out
@@ -7,8 +7,10 @@ os.environ.setdefault("NO_PROXY", "127.0.0.1,localhost,.local")
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .deps import get_store
-from .api import chat, health  # importa routers
+from .deps import LIVE_COMPACT_SECS, get_store
+from .live import start_compactor
+from .rag import start_answer_bank_refresh
+from .api import admin, chat, health  # importa routers
 
 app = FastAPI(title="CloudWalk Chatbot")
 
@@ -22,19 +24,26 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=allow_origins,
     allow_credentials=True,
-    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
     allow_headers=[
         "Content-Type", "Authorization", "Accept", "Origin",
-        "X-Requested-With", "X-Api-Key"
+        "X-Requested-With", "X-Api-Key", "X-Profile"
     ],
-    expose_headers=["Content-Type"],
+    expose_headers=["Content-Type", "X-Profile-Id"],
     max_age=86400,
 )
 
 @app.on_event("startup")
 def warm():
-    get_store()
+    s = get_store()
+    # regenera respostas do banco que ficaram de outra versão do índice
+    start_answer_bank_refresh()
+    # e de novo quando um shard remoto recarrega (o banco é da versão combinada dos shards)
+    s.on_remote_change = start_answer_bank_refresh
+    # grava periodicamente o shard live em disco e trunca o WAL
+    start_compactor(s.compact_live, LIVE_COMPACT_SECS, on_compact=start_answer_bank_refresh)
 
 # registra as rotas
 app.include_router(chat.router)
 app.include_router(health.router)
+app.include_router(admin.router)
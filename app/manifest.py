@@ -0,0 +1,44 @@
+# app/manifest.py
+"""
+Manifest dos índices em disco (index/shards/manifest.json e um por shard).
+
+A versão é um hash do conteúdo indexado (textos + URLs). Ela é gravada junto
+com o index.faiss e com o índice léxico de cada shard, para o Store saber se os artefatos
+em disco foram gerados juntos.
+"""
+import hashlib
+import json
+import pathlib
+import time
+from typing import Sequence
+
+MANIFEST_NAME = "manifest.json"
+
+
+def content_version(texts: Sequence[str], urls: Sequence[str]) -> str:
+    h = hashlib.sha1()
+    for t, u in zip(texts, urls):
+        h.update(str(u).encode("utf-8"))
+        h.update(b"\0")
+        h.update(t.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+def write_manifest(index_dir: pathlib.Path, version: str, **extra) -> dict:
+    data = {"version": version, "built_at": int(time.time()), **extra}
+    fp = pathlib.Path(index_dir) / MANIFEST_NAME
+    tmp = fp.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.replace(fp)   # quem lê nunca vê um manifest pela metade
+    return data
+
+
+def read_manifest(index_dir: pathlib.Path) -> dict:
+    fp = pathlib.Path(index_dir) / MANIFEST_NAME
+    if not fp.exists():
+        return {}
+    try:
+        return json.loads(fp.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
@@ -0,0 +1,198 @@
+# app/profiling.py
+"""
+Profiling sob demanda do /chat.
+
+Uma requisição é perfilada quando:
+- traz o header X-Profile: 1 junto com X-Api-Key = ADMIN_API_KEY; ou
+- traz ?debug_profile=1 junto com o header X-Api-Key = ADMIN_API_KEY (a chave
+  nunca vai na URL, que acaba nos logs de acesso do uvicorn/proxy); ou
+- cai na amostragem aleatória (PROFILE_SAMPLE_RATE, 0 = desligado).
+
+Para a requisição perfilada são gravados em data/profiles/:
+- <id>.prof -> cProfile (abra com snakeviz / pstats) da thread da requisição
+               somado ao das tarefas que ela dispara em outras threads via
+               propagate() (busca nos shards, textos, LLM e tentativas de hedge)
+- <id>.json -> tempos por etapa (embed, faiss:<shard>, bm25:<shard>, fusão, LLM...)
+               e as funções mais caras
+
+Só os PROFILE_KEEP profiles mais recentes ficam em disco: os mais antigos são
+apagados a cada gravação.
+
+Sem profiling ativo, stage() custa um ContextVar.get() e nada mais.
+"""
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import pathlib
+import pstats
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+_current: contextvars.ContextVar["RequestProfile | None"] = contextvars.ContextVar("request_profile", default=None)
+
+# cProfile não gosta de dois perfis ativos ao mesmo tempo (no 3.12+ é erro);
+# se já houver um rodando, a requisição fica só com os tempos por etapa
+_cprofile_lock = threading.Lock()
+
+
+class RequestProfile:
+    def __init__(self, label: str, reason: str):
+        self.id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:8]
+        self.label = label
+        self.reason = reason
+        self.stages: list[tuple[str, float]] = []
+        self.profiler: cProfile.Profile | None = None
+        self.worker_profilers: list[cProfile.Profile] = []   # um por tarefa em outra thread
+        self.started = time.perf_counter()
+        self.total = 0.0
+
+    def add_stage(self, name: str, secs: float):
+        self.stages.append((name, secs))   # list.append é atômico: ok vindo de outras threads
+
+    def save(self, out_dir: pathlib.Path) -> dict:
+        out_dir = pathlib.Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        top = ""
+        workers = list(self.worker_profilers)
+        if self.profiler is not None:
+            buf = io.StringIO()
+            stats = pstats.Stats(self.profiler, stream=buf)
+            for p in workers:
+                stats.add(p)
+            stats.dump_stats(str(out_dir / f"{self.id}.prof"))
+            stats.sort_stats("cumulative").print_stats(30)
+            top = buf.getvalue()
+
+        totals: dict[str, float] = {}
+        for name, secs in self.stages:
+            totals[name] = totals.get(name, 0.0) + secs
+        report = {
+            "id": self.id,
+            "label": self.label,
+            "reason": self.reason,
+            "total_secs": round(self.total, 6),
+            "stages": [{"stage": n, "secs": round(s, 6)} for n, s in self.stages],
+            "stage_totals": {n: round(s, 6) for n, s in totals.items()},
+            "has_cprofile": self.profiler is not None,
+            "profiled_worker_tasks": len(workers),
+            "top_functions": top,
+        }
+        (out_dir / f"{self.id}.json").write_text(json.dumps(report, ensure_ascii=False, indent=1), encoding="utf-8")
+        return report
+
+
+@contextmanager
+def stage(name: str):
+    """Mede uma etapa da requisição perfilada (no-op se não houver profiling)."""
+    prof = _current.get()
+    if prof is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        prof.add_stage(name, time.perf_counter() - t0)
+
+
+def _run_profiled(prof: RequestProfile, fn, a, kw):
+    # o cProfile só enxerga a thread em que foi ligado: cada tarefa tem o seu,
+    # somado ao da requisição no save()
+    if prof.profiler is None:
+        return fn(*a, **kw)
+    p = cProfile.Profile()
+    try:
+        p.enable()
+    except ValueError:
+        # 3.12+: um perfil por vez no processo, e o da requisição já vê todas as threads
+        return fn(*a, **kw)
+    try:
+        return fn(*a, **kw)
+    finally:
+        p.disable()
+        prof.worker_profilers.append(p)
+
+
+def propagate(fn):
+    """
+    Para tarefas enviadas a thread pools (ou threads próprias): leva o profile
+    atual junto, para que stage() funcione na outra thread e o cProfile cubra
+    a tarefa. Sem profiling, devolve fn como está.
+    """
+    prof = _current.get()
+    if prof is None:
+        return fn
+    ctx = contextvars.copy_context()   # um contexto por tarefa (não pode ser usado por 2 threads)
+    return lambda *a, **kw: ctx.run(_run_profiled, prof, fn, a, kw)
+
+
+def requested_reason(headers, query_params, admin_key: str | None, sample_rate: float) -> str | None:
+    """Motivo para perfilar esta requisição ('header', 'query', 'sample') ou None."""
+    if admin_key and headers.get("x-api-key") == admin_key:
+        if headers.get("x-profile") == "1":
+            return "header"
+        if query_params.get("debug_profile") == "1":
+            return "query"
+    if sample_rate > 0 and random.random() < sample_rate:
+        return "sample"
+    return None
+
+
+def prune_profiles(out_dir: pathlib.Path, keep: int) -> int:
+    """Apaga os profiles mais antigos (.json + .prof) além dos keep mais recentes."""
+    reports = sorted(pathlib.Path(out_dir).glob("*.json"), reverse=True)   # id começa pela data
+    removed = 0
+    for fp in reports[keep:]:
+        for f in (fp, fp.with_suffix(".prof")):
+            f.unlink(missing_ok=True)
+        removed += 1
+    return removed
+
+
+@contextmanager
+def maybe_profile(reason: str | None, label: str, out_dir: pathlib.Path, keep: int = 200):
+    """
+    Perfila o bloco se reason não for None; devolve o RequestProfile (ou None).
+    Depois de gravar, mantém só os keep profiles mais recentes em out_dir.
+    """
+    if reason is None:
+        yield None
+        return
+    prof = RequestProfile(label, reason)
+    token = _current.set(prof)
+    own_cprofile = _cprofile_lock.acquire(blocking=False)
+    if own_cprofile:
+        prof.profiler = cProfile.Profile()
+        prof.profiler.enable()
+    try:
+        yield prof
+    finally:
+        if own_cprofile:
+            prof.profiler.disable()
+            _cprofile_lock.release()
+        prof.total = time.perf_counter() - prof.started
+        _current.reset(token)
+        try:
+            prof.save(out_dir)
+            prune_profiles(out_dir, keep)
+        except Exception:
+            logging.exception("Erro ao gravar profile %s", prof.id)
+
+
+def list_profiles(out_dir: pathlib.Path, limit: int = 50) -> list[dict]:
+    out_dir = pathlib.Path(out_dir)
+    if not out_dir.exists():
+        return []
+    items = []
+    for fp in sorted(out_dir.glob("*.json"), reverse=True)[:limit]:
+        try:
+            r = json.loads(fp.read_text(encoding="utf-8"))
+        except Exception:
+            continue
+        items.append({k: r.get(k) for k in ("id", "label", "reason", "total_secs", "stage_totals", "has_cprofile")})
+    return items
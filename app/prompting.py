@@ -0,0 +1,68 @@
+# app/prompting.py
+"""
+Montagem do prompt do /chat a partir do template versionado do prompts.yaml.
+
+Provedores com cache automático de prefixo (OpenAI, vLLM, ...) só reaproveitam
+o começo do prompt que é idêntico byte a byte ao de requisições anteriores.
+Por isso as mensagens seguem sempre a mesma ordem:
+
+    system  -> prompt de sistema (fixo)
+    user    -> estilo + todas as regras base    (fixo por estilo)
+               regras das intenções detectadas  (variável)
+               CONTEXTOS + pergunta             (variável)
+
+O prefixo de cada estilo é montado uma vez só; nada de dados da requisição
+entra antes dele.
+
+A ordem fixa é condição, não garantia de cache: a OpenAI só cacheia prompts a
+partir de 1024 tokens, e o prefixo fixo atual (sistema + estilo + regras) tem
+uns 600. Com ela, o cache só passa a valer quando o prefixo crescer (mais
+regras, exemplos); o boot avisa quando ele está abaixo do limite.
+"""
+from typing import Dict, List
+
+PREFIX_CACHE_MIN_TOKENS = 1024   # mínimo do cache automático de prefixo da OpenAI
+CHARS_PER_TOKEN = 4              # estimativa grosseira, suficiente para o aviso
+
+
+class PromptTemplate:
+    def __init__(self, system: str, styles: Dict[str, str], rules: str,
+                 intents: List[dict], version):
+        self.system = system.strip()
+        self.styles = styles
+        self.version = version
+        self.intents = [
+            (it["name"], [t.lower() for t in it["triggers"]], it["rules"].strip())
+            for it in intents
+        ]
+        rules = rules.strip()
+        self._prefix = {name: f"{text.strip()}\n\n{rules}\n\n" for name, text in styles.items()}
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "PromptTemplate":
+        """cfg = conteúdo do prompts.yaml (system, styles, template)."""
+        tpl = cfg["template"]
+        return cls(cfg["system"], cfg["styles"], tpl["rules"], tpl.get("intents", []), tpl.get("version"))
+
+    def prefix(self, style: str) -> str:
+        return self._prefix.get(style, self._prefix["default"])
+
+    def prefix_tokens(self, style: str = "default") -> int:
+        """Tamanho estimado (em tokens) da parte fixa do prompt: sistema + estilo + regras."""
+        return (len(self.system) + len(self.prefix(style))) // CHARS_PER_TOKEN
+
+    def intent_rules(self, query: str) -> List[str]:
+        """Regras das intenções cujas palavras-gatilho aparecem na pergunta."""
+        q = query.lower()
+        return [rules for _, triggers, rules in self.intents if any(t in q for t in triggers)]
+
+    def messages(self, query: str, ctx: str, style: str = "default") -> List[dict]:
+        extra = self.intent_rules(query)
+        tail = ""
+        if extra:
+            tail += "Regras específicas desta pergunta:\n" + "\n".join(extra) + "\n\n"
+        tail += f"CONTEXTOS:\n{ctx}\n\nPergunta: {query}\n"
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.prefix(style) + tail},
+        ]
@@ -1,7 +1,20 @@
 # app/rag.py
 from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 import logging
-from .deps import get_store
+import threading
+import numpy as np
+from .deps import (
+    ANSWER_BANK_AUTO_REFRESH, EXTRACTIVE_MIN_CONFIDENCE, EXTRACTIVE_MIN_RETRIEVAL_SCORE,
+    FUSION_DENSE_WEIGHT, FUSION_METHOD, LLM_ADMISSION_WAIT_SECS, LLM_MAX_CONCURRENCY,
+    LLM_TIMEOUT_SECS, RETRIEVE_OVERFETCH, get_store,
+)
+from .dedup import DUP_THRESHOLD, minhash, similarity
+from .extractive import extractive_answer
+from .fusion import Hit, fuse, query_prior_weights
+from .lexical import tokenize
+from .llm import prompt_cache_usage
+from .shards import route_shards
+from .profiling import propagate, stage
 import json
 from pathlib import Path
 from typing import List, Dict
@@ -13,10 +26,16 @@ try:
 except Exception:
     AUG_RULES = {}  # fallback seguro
 
-# limite (segundos) de quanto vamos esperar pela resposta do LLM
-LLM_TIMEOUT_SECS = 90
+FAQ_PATH = Path(__file__).parent / "config" / "faq_questions.json"
+
 LLM_MAX_TOKENS = 600
 
+# admissão de chamadas ao LLM: acima disso, responde em modo extrativo em vez de enfileirar
+_llm_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+# chunks do código de ética + embeddings, da versão do índice em que foram lidos
+_etica_cache: dict = {}
+
 def get_expansions(user_query: str) -> list[str]:
     """
     Gera expansões dinâmicas baseadas na presença de palavras-chave.
@@ -59,7 +78,30 @@ def build_retrieval_query(user_query: str) -> str:
 
 
 
-def retrieve(query: str, k=6):
+def _etica_chunks(s):
+    """
+    Chunks do código de ética e conduta e seus embeddings, calculados uma vez
+    por versão do índice (embedar ~900 palavras por chunk não cabe na requisição).
+    """
+    version = s.index_version
+    cached = _etica_cache.get(version)
+    if cached is None:
+        etica = s.chunks_with_url("code-of-ethics-and-conduct")
+        if not etica:
+            return [], None   # não guarda: pode ser um shard remoto fora do ar
+        with stage("embed_etica"):
+            cached = (etica, s.embed_texts([t for t, _ in etica]))
+        _etica_cache.clear()
+        _etica_cache[version] = cached
+    return cached
+
+
+def retrieve(query: str, k=6, q_emb=None):
+    """
+    Top-k trechos para a pergunta. q_emb é o embedding da pergunta, se quem
+    chama já o tem (generate_answer usa no banco de respostas): é reaproveitado
+    quando a query de busca não ganhou expansões.
+    """
     s = get_store()
     q_lower = query.lower()
 
@@ -74,58 +116,113 @@ def retrieve(query: str, k=6):
 
     if precisa_etica_marca:
         # pega TODOS os chunks cujo URL é o código de ética e conduta
-        etica_hits = [
-            (text, url)
-            for text, url in zip(s.texts, s.meta)
-            if "code-of-ethics-and-conduct" in str(url)
-        ]
-        if etica_hits:
-            # devolve só esses (até k)
-            return etica_hits[:k]
+        etica, etica_embs = _etica_chunks(s)
+        if etica:
+            # devolve só esses (até k), mas com score de verdade: a parte densa da
+            # fusão (cosseno com a pergunta), para o gate do modo extrativo não
+            # tratar o atalho como certeza
+            if q_emb is None:
+                with stage("embed"):
+                    q_emb = s.embed(query)
+            sims = etica_embs @ np.asarray(q_emb, dtype=np.float32).reshape(-1)
+            order = np.argsort(-sims, kind="stable")
+            empty = np.empty(0, dtype=np.float32)
+            fused = fuse(len(etica), order, sims[order], empty.astype(np.int64), empty,
+                         method=FUSION_METHOD, dense_weight=FUSION_DENSE_WEIGHT)
+            return [Hit(etica[c][0], etica[c][1], float(fused[c])) for c in order[:k]]
         # se por algum motivo não achar, cai pro fluxo padrão abaixo
 
     # 1) Fluxo padrão: reescreve query e faz busca vetorial + BM25
     retr_query = build_retrieval_query(query)
 
-    D, I = s.index.search(s.embed(retr_query), k)
-    hits = [(s.texts[i], s.meta[i]) for i in I[0]]
-
-    bm = s.bm25.get_top_n(retr_query.split(), list(range(len(s.texts))), n=k)
-    for i in bm:
-        par = (s.texts[i], s.meta[i])
-        if par not in hits:
-            hits.append(par)
-
-    # 2) Se falar de CloudWalk, dá um boost pra URLs da CloudWalk
-    if "cloudwalk" in q_lower:
-        def sort_key(hit):
-            text, url = hit
-            u = str(url)
-            score = 0
-            if "cloudwalk.io" in u:
-                score -= 1
-            if ("missao" in q_lower or "missão" in q_lower) and "our-mission" in u:
-                score -= 3
-            if ("valor" in q_lower or "pilar" in q_lower) and (
-                "our-pillars" in u or "code-of-ethics" in u
-            ):
-                score -= 2
-            return score
-
-        hits.sort(key=sort_key)
+    if q_emb is not None and retr_query == query:
+        q_emb = np.asarray(q_emb, dtype=np.float32).reshape(1, -1)
+    else:
+        with stage("embed"):
+            q_emb = s.embed(retr_query)
+
+    # busca em paralelo só nos shards relevantes (ver SHARD_ROUTES), com folga de candidatos para a fusão
+    with stage("search"):
+        dense, lexical = s.search(
+            q_emb, tokenize(retr_query), k * RETRIEVE_OVERFETCH,
+            shards=route_shards(query, s.shards),
+        )
+    with stage("merge"):
+        # candidatos = (shard, id local); o mesmo chunk nas duas listas vira um candidato só
+        pos: dict = {}
+        keys = []
+        for _, sh, i in dense + lexical:
+            if (sh.name, i) not in pos:
+                pos[(sh.name, i)] = len(keys)
+                keys.append((sh, i))
+        if not keys:
+            return []
+        fused = fuse(
+            len(keys),
+            np.asarray([pos[(sh.name, i)] for _, sh, i in dense], dtype=np.int64),
+            np.asarray([sc for sc, _, _ in dense], dtype=np.float32),
+            np.asarray([pos[(sh.name, i)] for _, sh, i in lexical], dtype=np.int64),
+            np.asarray([sc for sc, _, _ in lexical], dtype=np.float32),
+            method=FUSION_METHOD, dense_weight=FUSION_DENSE_WEIGHT,
+        )
 
-    return hits[:k]
+        # 2) boosts por URL (ex.: missão/pilares da CloudWalk) como priors por chunk
+        weights = query_prior_weights(query)
+        rank = fused
+        if weights.any():
+            by_shard: dict = {}
+            for c, (sh, i) in enumerate(keys):
+                by_shard.setdefault(sh.name, (sh, [], []))
+                by_shard[sh.name][1].append(c)
+                by_shard[sh.name][2].append(i)
+            boost = np.zeros(len(keys), dtype=np.float32)
+            for sh, cands, ids in by_shard.values():
+                boost[cands] = sh.prior_rows(ids) @ weights
+            rank = fused + boost
+
+        # 3) só agora lê os textos (em lotes, na ordem), descartando quase duplicatas até ter k hits
+        order = np.argsort(-rank, kind="stable")
+        hits, sigs = [], []
+        for start in range(0, len(order), 2 * k):
+            batch = order[start:start + 2 * k]
+            for c, doc in zip(batch, s.fetch_docs([keys[c] for c in batch])):
+                if doc is None:
+                    continue
+                sig = minhash(doc[0])
+                if any(similarity(sig, other) >= DUP_THRESHOLD for other in sigs):
+                    continue
+                hits.append(Hit(doc[0], doc[1], float(fused[c])))
+                sigs.append(sig)
+                if len(hits) == k:
+                    break
+            if len(hits) == k:
+                break
+
+    return hits
 
 
 def format_ctx(hits):
     ctx = []
     refs = []
-    for j, (t, url) in enumerate(hits, 1):
-        ctx.append(f"[{j}] Fonte: {url}\nTrecho: {t[:1200]}")
-        refs.append((j, url))
+    for j, h in enumerate(hits, 1):
+        ctx.append(f"[{j}] Fonte: {h.url}\nTrecho: {h.text[:1200]}")
+        refs.append((j, h.url))
     return "\n\n".join(ctx), refs
 
-def generate_answer(query: str, style="default"):
+def generate_answer(query: str, style="default", use_bank: bool = True, mode: str = "auto"):
+    """
+    mode:
+    - "auto": resposta extrativa se a confiança for alta; senão LLM
+      (e extrativa se a fila do LLM estiver cheia);
+    - "llm": sempre LLM;
+    - "extractive": sempre extrativa, sem LLM.
+    O banco de respostas (use_bank) só é consultado no "auto".
+    """
+    return answer_with_hits(query, style, use_bank, mode)[0]
+
+
+def answer_with_hits(query: str, style="default", use_bank: bool = True, mode: str = "auto", q_emb=None):
+    """Como generate_answer, mas devolve (resposta, hits usados como contexto)."""
     s = get_store()
     q_lower = query.lower()
 
@@ -143,101 +240,167 @@ def generate_answer(query: str, style="default"):
             "Não encontrei informações suficientes nos contextos para responder com precisão. "
             "Este assistente nunca apresenta números, estimativas, métricas financeiras ou "
             "quantidade de clientes sem evidência direta nos trechos recuperados."
-        )
+        ), []
     
-    # Recupera contextos e monta prompt
-    ctx, refs = format_ctx(retrieve(query))
-    extra_req = (
-        "Regras IMPORTANTES para a resposta:\n"
-        "- Use SOMENTE os trechos presentes em CONTEXTOS.\n"
-        "- Nunca invente dados, fatos, números, métricas ou quantidades.\n"
-        "- Se a pergunta envolver clientes, faturamento, receita, volume transacionado "
-        "ou qualquer dado financeiro e isso não estiver claramente nos CONTEXTOS, "
-        "diga explicitamente que não há informação suficiente nos contextos para responder.\n"
-        "- Não introduza nomes de pessoas ou cargos que não apareçam nos CONTEXTOS. "
-        "Se precisar citar alguém, use apenas nomes explicitamente presentes nos trechos.\n"
-        "- Se não houver nenhuma informação nos CONTEXTOS sobre o tema da pergunta, "
-        "explique claramente que não encontrou resposta nos trechos.\n"
-        "- Se houver qualquer informação relacionada nos CONTEXTOS, responda usando esses trechos, "
-        "mesmo que a informação seja parcial ou resumida, deixando claro quando a resposta for limitada.\n"
-    )
-
-    # País / sede
-    if any(t in q_lower for t in ["país", "pais", "sede", "onde fica", "de qual país"]):
-        extra_req += (
-            "\n- Se os CONTEXTOS trouxerem o país de origem e a cidade da sede da CloudWalk, "
-            "mencione os dois explicitamente (por exemplo: 'empresa brasileira, sediada em São Paulo, Brasil')."
-        )
-
-    # Representar / uso da marca
-    if any(t in q_lower for t in [
-        "representa", "representar", "representante", "representantes",
-        "eventos", "entrevista", "podcast", "painel", "uso da marca", "usar a marca"
-    ]):
-        extra_req += (
-            "\n- Sobre quem pode representar a CloudWalk ou usar a marca em eventos, entrevistas, podcasts "
-            "ou painéis, não invente regras nem cite pessoas específicas (como fundador ou CEO) "
-            "a menos que isso esteja literalmente escrito nos CONTEXTOS.\n"
-            "- Se os CONTEXTOS mencionarem grupos como colaboradores, parceiros, fornecedores "
-            "ou prestadores de serviço, explique que são esses grupos que podem representar a "
-            "empresa, desde que sigam as diretrizes de alinhamento com liderança e time de marca.\n"
-            "- Se houver trechos falando de 'uso da marca' ou 'comunicação externa', transforme essas orientações "
-            "em tópicos claros para o usuário, em vez de dizer que não há informações."
-        )
-
-    # Perguntas que falam explicitamente de regras / diretrizes
-    if any(t in q_lower for t in ["regras", "regra", "diretrizes", "diretriz", "política", "politica"]):
-        extra_req += (
-            "\n- Como a pergunta menciona 'regras', 'diretrizes' ou 'política', organize a resposta em tópicos, "
-            "resumindo como regras ou diretrizes aquilo que estiver descrito nos CONTEXTOS.\n"
-            "- Não invente regras novas: apenas reformule em bullet points o que já aparece nos trechos.\n"
-            "- Se existir ao menos uma orientação relacionada ao tema nos CONTEXTOS, você DEVE apresentá-la; "
-            "não responda que 'não há informações suficientes' se houver alguma orientação explícita."
-        )
-
-    prompt = f"""{s.styles.get(style, s.styles['default'])}
-
-    {extra_req}
-
-CONTEXTOS:
-{ctx}
-
-Pergunta: {query}
-- Use apenas os CONTEXTOS. Cite as fontes como [n].
-- Se alguma parte da resposta não estiver clara ou explícita nos CONTEXTOS, diga claramente que essa parte não aparece nos trechos.
-- Se houver qualquer informação relacionada nos CONTEXTOS, use esses trechos para montar a resposta, mesmo que de forma parcial, deixando claro quando algo for limitado.
-"""
-
-    # função que chama o cliente do LLM sem timeout (parâmetros permitidos)
+    # Perguntas frequentes: resposta pré-computada para a versão atual do índice.
+    # O banco só atende o modo auto: "extractive"/"llm" explícitos sempre geram de novo.
+    if q_emb is None:
+        with stage("embed_query"):
+            q_emb = s.embed(query)[0]
+    if use_bank and mode == "auto":
+        with stage("answer_bank"):
+            cached = s.answer_bank.lookup(q_emb, style, s.index_version)
+        if cached is not None:
+            return cached, []
+
+    # Recupera contextos (o embedding da pergunta é reaproveitado)
+    with stage("retrieve"):
+        hits = retrieve(query, q_emb=q_emb)
+    ctx, refs = format_ctx(hits)
+    fontes = "Fontes: " + " ".join(f"[{i}] {u}" for i, u in refs)
+
+    # Modo extrativo: frases dos melhores trechos, com [n], sem chamar o LLM.
+    # No "auto", o gate barato (score do 1º hit) vem antes: embedar as frases dos
+    # trechos só vale a pena se a resposta extrativa puder ser usada.
+    extractive = None
+    well_ranked = bool(hits) and hits[0].score >= EXTRACTIVE_MIN_RETRIEVAL_SCORE
+    if mode == "extractive" or (mode == "auto" and well_ranked):
+        with stage("extractive"):
+            extractive = extractive_answer(q_emb, hits, s.embed_texts)
+        body, confidence = extractive
+        if mode == "extractive":
+            if not body:
+                return "Não encontrei nos trechos recuperados frases que respondam à pergunta.\n\n" + fontes, hits
+            return body + "\n\n" + fontes, hits
+        # só dispensa o LLM se a frase também bate com a pergunta
+        if body and confidence >= EXTRACTIVE_MIN_CONFIDENCE:
+            return body + "\n\n" + fontes, hits
+
+    # Monta prompt: prefixo fixo (sistema, estilo, regras) + regras da intenção, contextos e pergunta
+    messages = s.prompt.messages(query, ctx, style)
+
+    # chama o LLM (hedging/fallback entre backends fica em app/llm.py)
     def _call_llm():
-        # NÃO usar request_timeout aqui (causa TypeError em alguns SDKs)
-        return s.llm.chat.completions.create(
-            model=s.model,
-            messages=[
-                {"role": "system", "content": s.system},
-                {"role": "user", "content": prompt}
-            ],
+        return s.llm.complete(
+            messages,
+            timeout=LLM_TIMEOUT_SECS,
             temperature=0.2,
             max_tokens=LLM_MAX_TOKENS,
         )
 
+    # Fila do LLM cheia: degrada para a resposta extrativa em vez de esperar o timeout
+    if not _llm_slots.acquire(timeout=LLM_ADMISSION_WAIT_SECS):
+        logging.warning("LLM saturado (%s chamadas em andamento); respondendo em modo extrativo", LLM_MAX_CONCURRENCY)
+        if extractive is None:
+            with stage("extractive"):
+                extractive = extractive_answer(q_emb, hits, s.embed_texts)
+        body, _ = extractive
+        if body:
+            return body + "\n\n" + fontes, hits
+        return "Erro: serviço sobrecarregado no momento. Tente novamente em instantes.", hits
+
+    def _call_llm_slot():
+        try:
+            return _call_llm()
+        finally:
+            _llm_slots.release()
+
     try:
-        with ThreadPoolExecutor(max_workers=1) as ex:
-            fut = ex.submit(_call_llm)
+        with stage("llm"), ThreadPoolExecutor(max_workers=1) as ex:
+            fut = ex.submit(propagate(_call_llm_slot))
             r = fut.result(timeout=LLM_TIMEOUT_SECS)
 
-        # extrai o texto (compatível com retorno do SDK estilo OpenAI-like)
-        answer = r.choices[0].message.content
-        return answer + "\n\n" + "Fontes: " + " ".join(f"[{i}] {u}" for i, u in refs)
+        prompt_tokens, cached_tokens = prompt_cache_usage(r.usage)
+        logging.info(
+            "LLM %s: prompt v%s, %s tokens de prompt, %s do cache",
+            r.backend, s.prompt.version, prompt_tokens, cached_tokens,
+        )
+        answer = r.text
+        return answer + "\n\n" + fontes, hits
 
-    except FutureTimeout:
+    except (FutureTimeout, TimeoutError):
         logging.warning("LLM timeout after %s seconds", LLM_TIMEOUT_SECS)
         fallback = "Erro: tempo limite ao gerar resposta. Tente novamente ou peça uma resposta mais concisa."
         if ctx:
             # mostra uma prévia dos trechos recuperados para o usuário
             fallback += "\n\nTrechos recuperados (prévia):\n" + (ctx[:1500] + ("..." if len(ctx) > 1500 else ""))
-        return fallback
+        return fallback, hits
 
     except Exception as e:
         logging.exception("Erro ao chamar LLM")
-        return f"Erro ao gerar resposta: {type(e).__name__}: {e}"
+        return f"Erro ao gerar resposta: {type(e).__name__}: {e}", hits
+
+
+def load_faq_questions() -> list[str]:
+    try:
+        with FAQ_PATH.open(encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        logging.exception("Erro ao ler %s", FAQ_PATH)
+        return []
+
+
+def refresh_answer_bank(force: bool = False) -> int:
+    """
+    (Re)gera as respostas do banco para a versão atual do índice.
+    Sem force, só processa pares (pergunta, estilo) ausentes ou de outra versão.
+    Retorna quantas respostas foram gravadas.
+    """
+    s = get_store()
+    bank = s.answer_bank
+    version = s.index_version
+    questions = load_faq_questions()
+    styles = list(s.styles)
+
+    if force:
+        todo = [(q, st) for q in questions for st in styles]
+    else:
+        todo = bank.stale(questions, styles, version)
+
+    done = 0
+    for q, st in todo:
+        q_emb = s.embed(q)[0]
+        answer, hits = answer_with_hits(q, style=st, use_bank=False, mode="llm", q_emb=q_emb)
+        if answer.startswith("Erro"):
+            logging.warning("Banco de respostas: falhou para %r (%s)", q, st)
+            continue
+        sources = [str(h.url) for h in hits]
+        bank.put(q, st, answer, sources, version, q_emb)
+        done += 1
+
+    removed = bank.prune(version)
+    logging.info("Banco de respostas: %s gravadas, %s antigas removidas (versão %s)", done, removed, version)
+    return done
+
+
+_bank_refresh_lock = threading.Lock()   # protege _bank_refresh
+_bank_refresh = {"running": False, "again": False}
+
+
+def start_answer_bank_refresh():
+    """
+    Regenera o banco em background (se habilitado). Pedido que chega com uma
+    regeneração em andamento faz ela rodar de novo no fim: a versão do índice
+    pode ter mudado no meio (ex.: um shard remoto recarregado).
+    """
+    if not ANSWER_BANK_AUTO_REFRESH:
+        return
+    with _bank_refresh_lock:
+        if _bank_refresh["running"]:
+            _bank_refresh["again"] = True
+            return
+        _bank_refresh["running"] = True
+
+    def _run():
+        while True:
+            try:
+                refresh_answer_bank()
+            except Exception:
+                logging.exception("Erro ao atualizar o banco de respostas")
+            with _bank_refresh_lock:
+                if not _bank_refresh["again"]:
+                    _bank_refresh["running"] = False
+                    return
+                _bank_refresh["again"] = False
+
+    threading.Thread(target=_run, name="answer-bank-refresh", daemon=True).start()
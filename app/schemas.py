@@ -1,8 +1,14 @@
+from typing import Literal
 from pydantic import BaseModel
 
 class ChatIn(BaseModel):
     question: str
     style: str | None = "default"
+    mode: Literal["auto", "llm", "extractive"] | None = "auto"
 
 class ChatOut(BaseModel):
     answer: str
+
+class DocumentIn(BaseModel):
+    url: str
+    text: str
@@ -0,0 +1,246 @@
+# app/shard_rpc.py
+"""
+Shards remotos: protocolo binário entre o Store (coordenador) e
+scripts/shard_server.py, que serve a busca FAISS + BM25 de um shard.
+
+Tudo é HTTP com corpo application/octet-stream, little-endian:
+
+POST /search    req:  <II k, dim> + dim float32 (embedding)
+                      + <QdI n_docs, total_len, n_df> + n_df uint32 (df de cada token; 0 = sem
+                        estatísticas globais) + tokens em UTF-8 separados por espaço
+                resp: <II n_dense, n_lex> + para cada lista: n int64 ids, n float32 scores,
+                      n uint8 priors (bit p = prior p de app/fusion.py)
+POST /df        req:  tokens em UTF-8 separados por espaço
+                resp: uint32 df de cada token no shard
+POST /docs      req:  int64 ids
+                resp: para cada id: <II len_texto, len_url> + texto + url (UTF-8)
+GET  /lookup?contains=<trecho>   resp: <I n> + n int64 ids + docs (como /docs)
+GET  /info      JSON {name, version, chunks, dim, n_docs, total_len}
+POST /reload    relê o shard do disco; devolve o /info
+
+A busca é em duas fases: /search devolve só ids e scores (alguns bytes por
+candidato) e o texto dos chunks finais vem depois, via /docs. Toda resposta
+traz o header X-Shard-Version: cada RemoteShard vale para uma versão só, e
+resposta de outra versão (o servidor recarregou entre o /search e o /docs)
+levanta ShardVersionChanged em vez de devolver o texto de outros ids.
+"""
+import logging
+import struct
+import threading
+from collections import OrderedDict
+from typing import List, Sequence, Tuple
+
+import numpy as np
+import requests
+
+from .fusion import URL_PRIORS
+from .lexical import TermStats
+
+_HEAD = struct.Struct("<II")
+_STATS = struct.Struct("<QdI")
+_DF_CACHE_MAX = 50_000   # termos com df em cache por shard remoto
+_PRIORS_CACHE_MAX = 50_000   # ids com linha de priors em cache por shard remoto
+_BITS = (1 << np.arange(len(URL_PRIORS))).astype(np.uint8)
+
+# ---------- codificação ----------
+
+
+def encode_search_request(q_emb: np.ndarray, tokens: Sequence[str], k: int,
+                          stats: TermStats | None = None) -> bytes:
+    q = np.ascontiguousarray(q_emb, dtype="<f4").reshape(-1)
+    if stats is None:
+        head, df = _STATS.pack(0, 0.0, 0), b""
+    else:
+        head = _STATS.pack(stats.n_docs, stats.total_len, len(tokens))
+        df = np.asarray([stats.df.get(t, 0) for t in tokens], dtype="<u4").tobytes()
+    return _HEAD.pack(k, len(q)) + q.tobytes() + head + df + " ".join(tokens).encode("utf-8")
+
+
+def decode_search_request(body: bytes) -> Tuple[np.ndarray, List[str], int, TermStats | None]:
+    k, dim = _HEAD.unpack_from(body)
+    off = _HEAD.size + 4 * dim
+    q = np.frombuffer(body[_HEAD.size:off], dtype="<f4").reshape(1, dim)
+    n_docs, total_len, n_df = _STATS.unpack_from(body, off)
+    off += _STATS.size
+    df = np.frombuffer(body, dtype="<u4", count=n_df, offset=off)
+    tokens = body[off + 4 * n_df:].decode("utf-8").split()
+    stats = TermStats(n_docs, total_len, dict(zip(tokens, df.tolist()))) if n_df else None
+    return q, tokens, k, stats
+
+
+def pack_priors(rows: np.ndarray) -> np.ndarray:
+    return ((np.asarray(rows) > 0).astype(np.uint8) * _BITS).sum(axis=1).astype(np.uint8)
+
+
+def unpack_priors(bits: np.ndarray) -> np.ndarray:
+    return ((bits[:, None] & _BITS) > 0).astype(np.float32)
+
+
+def encode_search_response(dense, lexical, dense_priors, lex_priors) -> bytes:
+    out = [_HEAD.pack(len(dense[0]), len(lexical[0]))]
+    for (ids, scores), bits in ((dense, dense_priors), (lexical, lex_priors)):
+        out += [
+            np.asarray(ids, dtype="<i8").tobytes(),
+            np.asarray(scores, dtype="<f4").tobytes(),
+            np.asarray(bits, dtype=np.uint8).tobytes(),
+        ]
+    return b"".join(out)
+
+
+def decode_search_response(body: bytes):
+    """-> ((ids, scores, priors), (ids, scores, priors))"""
+    n_dense, n_lex = _HEAD.unpack_from(body)
+    off = _HEAD.size
+    parts = []
+    for n in (n_dense, n_lex):
+        ids = np.frombuffer(body, dtype="<i8", count=n, offset=off); off += 8 * n
+        scores = np.frombuffer(body, dtype="<f4", count=n, offset=off); off += 4 * n
+        bits = np.frombuffer(body, dtype=np.uint8, count=n, offset=off); off += n
+        parts.append((ids, scores, bits))
+    return parts[0], parts[1]
+
+
+def encode_docs(docs: Sequence[Tuple[str, str]]) -> bytes:
+    out = []
+    for text, url in docs:
+        t, u = text.encode("utf-8"), str(url).encode("utf-8")
+        out += [_HEAD.pack(len(t), len(u)), t, u]
+    return b"".join(out)
+
+
+def decode_docs(body: bytes, offset: int = 0) -> List[Tuple[str, str]]:
+    docs = []
+    while offset < len(body):
+        lt, lu = _HEAD.unpack_from(body, offset)
+        offset += _HEAD.size
+        text = body[offset:offset + lt].decode("utf-8"); offset += lt
+        url = body[offset:offset + lu].decode("utf-8"); offset += lu
+        docs.append((text, url))
+    return docs
+
+
+# ---------- cliente ----------
+
+
+class ShardVersionChanged(Exception):
+    """O shard server respondeu com outra versão: ids e caches deste RemoteShard não valem mais."""
+
+    def __init__(self, name: str, expected: str, got: str):
+        super().__init__(f"{name}: versão {got} no servidor, esperava {expected}")
+        self.name, self.expected, self.got = name, expected, got
+
+
+class RemoteShard:
+    """
+    Shard servido por scripts/shard_server.py. Tem a mesma interface de busca
+    do Shard local (search, docs, prior_rows, find_url); falhas e timeouts
+    levantam exceção e o Store segue com os shards que responderam.
+
+    Cada objeto fica preso à versão do shard que viu primeiro (como um Shard
+    local carregado do disco). Quando o servidor recarrega, as chamadas
+    levantam ShardVersionChanged e o Store troca o objeto por renewed().
+    """
+
+    mutable = False
+    deleted: frozenset = frozenset()
+
+    def __init__(self, name: str, base_url: str, timeout: float, _local: threading.local | None = None):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.version = None
+        self.chunks = 0
+        # requests.Session não é thread-safe: uma por thread do fan-out (compartilhada com os renewed())
+        self._local = _local or threading.local()
+        self._priors: OrderedDict[int, np.ndarray] = OrderedDict()   # LRU id -> linha de priors, do /search
+        self._df: OrderedDict[str, int] = OrderedDict()   # LRU de df por termo
+        self.n_docs, self.total_len = 0, 0.0
+        self._lock = threading.Lock()
+        try:
+            self.refresh_info()
+        except Exception as e:
+            logging.warning("[SHARD] %s (%s) indisponível no boot: %s", name, self.base_url, e)
+
+    def __len__(self):
+        return self.chunks
+
+    @property
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _check_version(self, r):
+        v = r.headers.get("X-Shard-Version")
+        if not v:
+            return
+        with self._lock:
+            if self.version is None:   # servidor fora do ar no boot: vale a primeira versão vista
+                self.version = v
+            elif v != self.version:
+                raise ShardVersionChanged(self.name, self.version, v)
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        r = self._session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        # a versão vem antes do status: depois de um reload, ids antigos podem dar 400
+        self._check_version(r)
+        r.raise_for_status()
+        return r
+
+    def refresh_info(self) -> dict:
+        info = self._request("GET", "/info").json()
+        self.chunks = info.get("chunks", 0)
+        self.n_docs, self.total_len = info.get("n_docs", 0), info.get("total_len", 0.0)
+        return info
+
+    def renewed(self, reload: bool = False) -> "RemoteShard":
+        """RemoteShard na versão atual do servidor; reload=True pede antes um /reload."""
+        if reload:
+            self._session.post(f"{self.base_url}/reload", timeout=self.timeout).raise_for_status()
+        return RemoteShard(self.name, self.base_url, self.timeout, _local=self._local)
+
+    def term_stats(self, tokens: Sequence[str]) -> TermStats:
+        """Como Shard.term_stats; só vai ao servidor pelos termos fora do cache."""
+        terms = list(dict.fromkeys(tokens))
+        with self._lock:
+            missing = [t for t in terms if t not in self._df]
+        if missing:
+            r = self._request("POST", "/df", data=" ".join(missing).encode("utf-8"))
+            with self._lock:
+                self._df.update(zip(missing, np.frombuffer(r.content, dtype="<u4").tolist()))
+        with self._lock:
+            df = {}
+            for t in terms:
+                df[t] = self._df.get(t, 0)
+                if t in self._df:
+                    self._df.move_to_end(t)
+            while len(self._df) > _DF_CACHE_MAX:
+                self._df.popitem(last=False)
+        return TermStats(self.n_docs, self.total_len, df)
+
+    def search(self, q_emb: np.ndarray, tokens: Sequence[str], k: int, stats: TermStats | None = None):
+        r = self._request("POST", "/search", data=encode_search_request(q_emb, tokens, k, stats))
+        (d_ids, d_scores, d_bits), (l_ids, l_scores, l_bits) = decode_search_response(r.content)
+        with self._lock:
+            for ids, bits in ((d_ids, d_bits), (l_ids, l_bits)):
+                for i, row in zip(ids.tolist(), unpack_priors(bits)):
+                    self._priors[i] = row
+                    self._priors.move_to_end(i)
+            while len(self._priors) > _PRIORS_CACHE_MAX:
+                self._priors.popitem(last=False)
+        return (d_ids, d_scores), (l_ids, l_scores)
+
+    def prior_rows(self, ids: Sequence[int]) -> np.ndarray:
+        zero = np.zeros(len(URL_PRIORS), dtype=np.float32)
+        with self._lock:
+            return np.stack([self._priors.get(int(i), zero) for i in ids]).reshape(len(ids), len(URL_PRIORS))
+
+    def docs(self, ids: Sequence[int]) -> List[Tuple[str, str]]:
+        r = self._request("POST", "/docs", data=np.asarray(ids, dtype="<i8").tobytes())
+        return decode_docs(r.content)
+
+    def find_url(self, needle: str) -> List[Tuple[str, str]]:
+        r = self._request("GET", "/lookup", params={"contains": needle})
+        (n,) = struct.unpack_from("<I", r.content)
+        return decode_docs(r.content, 4 + 8 * n)
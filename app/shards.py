@@ -0,0 +1,295 @@
+# app/shards.py
+"""
+Índice particionado por fonte (shards).
+
+Cada shard é um diretório em index/shards/<nome>/ com:
+- index.faiss              -> vetores dos chunks do shard
+- texts.jsonl / meta.jsonl -> chunks e URLs de origem
+- bm25/                    -> índice léxico (ver app/lexical.py)
+- manifest.json            -> versão do shard
+
+O shard é gravado em <nome>.tmp/ e trocado de uma vez (save()), então um
+crash no meio nunca deixa index.faiss e texts.jsonl de gravações diferentes.
+
+index/shards/manifest.json lista os shards ativos e suas versões. Assim
+cada fonte (cloudwalk.io, blog, infinitepay.io, central de ajuda...) pode
+ser reconstruída e recarregada sem mexer nas outras.
+"""
+import contextlib
+import json
+import logging
+import os
+import pathlib
+import shutil
+import threading
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from .fusion import prior_matrix
+from .lexical import LexicalIndex, TermStats, merge_stats, tokenize
+from .manifest import content_version, read_manifest, write_manifest
+from .profiling import stage
+
+# (shard, trecho do host). A ordem importa: a primeira regra que casar vence.
+# Espelhos (r.jina.ai/..., textise) caem no shard da URL original porque o
+# casamento é feito na URL inteira.
+SHARD_RULES: List[Tuple[str, str]] = [
+    ("blog", "blog.cloudwalk.io"),
+    ("cloudwalk", "cloudwalk.io"),
+    ("ajuda", "ajuda.infinitepay.io"),
+    ("infinitepay", "infinitepay.io"),
+]
+DEFAULT_SHARD = "outros"
+LIVE_SHARD = "live"     # documentos ingeridos em runtime (ver app/live.py)
+
+# Roteamento por palavras da pergunta (mesma ideia do boost "cloudwalk" do
+# retrieve). Shards fora de qualquer rota (seed, outros...) são sempre consultados.
+SHARD_ROUTES: Dict[str, Tuple[str, ...]] = {
+    "cloudwalk": ("cloudwalk", "blog"),
+    "infinitepay": ("infinitepay", "ajuda"),
+    "maquininha": ("infinitepay", "ajuda"),
+    "taxa": ("infinitepay", "ajuda"),
+}
+
+
+def shard_for_url(url: str) -> str:
+    u = str(url).lower()
+    for name, needle in SHARD_RULES:
+        if needle in u:
+            return name
+    return DEFAULT_SHARD
+
+
+def route_shards(query: str, available: Iterable[str]) -> List[str]:
+    """Shards relevantes para a pergunta (todos, se nenhuma rota casar)."""
+    available = list(available)
+    q = query.lower()
+    routed = {s for trigger, names in SHARD_ROUTES.items() if trigger in q for s in names}
+    if not routed:
+        return available
+    routable = {s for names in SHARD_ROUTES.values() for s in names}
+    return [s for s in available if s in routed or s not in routable]
+
+
+def _fsync_tree(path: pathlib.Path):
+    for fp in sorted(path.rglob("*")):
+        if fp.is_file():
+            with open(fp, "rb") as fh:
+                os.fsync(fh.fileno())
+
+
+def _swap_dir(tmp: pathlib.Path, path: pathlib.Path):
+    """Troca path por tmp. Entre os dois os.replace só existe <nome>.old (ver recover_dir)."""
+    old = path.with_name(path.name + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    if path.exists():
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def recover_dir(path: pathlib.Path):
+    """Desfaz uma troca interrompida: sem <nome>/, volta o <nome>.old; descarta <nome>.tmp."""
+    path = pathlib.Path(path)
+    old = path.with_name(path.name + ".old")
+    if not path.exists() and old.exists():
+        os.replace(old, path)
+        print(f"[SHARD] {path.name}: troca interrompida; voltando à gravação anterior.")
+    shutil.rmtree(path.with_name(path.name + ".tmp"), ignore_errors=True)
+
+
+def write_shards_manifest(shards_dir: pathlib.Path, versions: Dict[str, str], **extra) -> str:
+    """Grava index/shards/manifest.json; a versão global deriva das versões dos shards."""
+    names = sorted(versions)
+    version = content_version([versions[n] for n in names], names)
+    write_manifest(shards_dir, version, shards=dict(versions), **extra)
+    return version
+
+
+class Shard:
+    """Um pedaço do índice: FAISS + BM25 + textos de uma fonte."""
+
+    def __init__(self, name: str, index, texts: List[str], sources: List[List[str]],
+                 bm25: LexicalIndex, version: str | None = None, mutable: bool = False):
+        self.name = name
+        self.index = index
+        self.texts = texts
+        self.sources = sources
+        self.meta = [u[0] for u in sources]        # URL principal (exibição/fontes)
+        self.priors = prior_matrix(sources)   # boosts por URL (ver app/fusion.py)
+        self.bm25 = bm25
+        self.version = version
+        # shards carregados do disco nunca mudam (recarregar = trocar o objeto),
+        # então só os mutáveis (seed/runtime) pagam o custo do lock na busca
+        self.mutable = mutable
+        self._lock = threading.RLock() if mutable else contextlib.nullcontext()
+        # tombstones: ids removidos de um shard mutável (saem de vez na compactação)
+        self.deleted: set[int] = set()
+
+    def __len__(self):
+        return len(self.texts) - len(self.deleted)
+
+    @classmethod
+    def from_embeddings(cls, name: str, texts: Sequence[str], sources: Sequence[Sequence[str]],
+                        embs: np.ndarray, dim: int | None = None,
+                        mutable: bool = False) -> "Shard":
+        index = faiss.IndexFlatIP(embs.shape[1] if len(embs) else dim)
+        if len(embs):
+            index.add(embs)
+        version = content_version(texts, [u[0] for u in sources])
+        bm25 = LexicalIndex.build([tokenize(t) for t in texts], version=version)
+        return cls(name, index, list(texts), [list(u) for u in sources], bm25, version, mutable)
+
+    @classmethod
+    def load(cls, name: str, path: pathlib.Path, mutable: bool = False) -> "Shard":
+        path = pathlib.Path(path)
+        recover_dir(path)
+        version = read_manifest(path).get("version")
+        index = faiss.read_index(str(path / "index.faiss"))
+        texts = [json.loads(l)["text"] for l in open(path / "texts.jsonl", encoding="utf-8")]
+        rows = [json.loads(l) for l in open(path / "meta.jsonl", encoding="utf-8")]
+        sources = [m.get("urls") or [m["url"]] for m in rows]
+
+        bm25_dir = path / "bm25"
+        if version and LexicalIndex.stored_version(bm25_dir) == version:
+            bm25 = LexicalIndex.load(bm25_dir)
+        else:
+            print(f"[SHARD] {name}: BM25 em disco ausente ou de outra versão; construindo em memória...")
+            bm25 = LexicalIndex.build([tokenize(t) for t in texts], version=version)
+        return cls(name, index, texts, sources, bm25, version, mutable)
+
+    def save(self, path: pathlib.Path, **extra):
+        """Grava em <path>.tmp/ (com fsync) e troca pelo diretório atual."""
+        path = pathlib.Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        with self._lock:
+            faiss.write_index(self.index, str(tmp / "index.faiss"))
+            self.bm25.version = self.version
+            self.bm25.save(tmp / "bm25")
+            (tmp / "texts.jsonl").write_text(
+                "\n".join(json.dumps({"text": t}) for t in self.texts), encoding="utf-8"
+            )
+            (tmp / "meta.jsonl").write_text(
+                "\n".join(json.dumps({"url": u[0], "urls": u}) for u in self.sources),
+                encoding="utf-8",
+            )
+            write_manifest(tmp, self.version, chunks=len(self.texts), **extra)
+        _fsync_tree(tmp)
+        _swap_dir(tmp, path)
+
+    def add(self, texts: Sequence[str], sources: Sequence[Sequence[str]], embs: np.ndarray):
+        """Acrescenta chunks já embedados (FAISS + BM25 incrementais)."""
+        if not self.mutable:
+            raise RuntimeError(f"shard '{self.name}' é somente leitura")
+        with self._lock:
+            self.index.add(embs)
+            self.bm25.extend([tokenize(t) for t in texts])
+            self.texts.extend(texts)
+            self.sources.extend(list(u) for u in sources)
+            self.meta.extend(u[0] for u in sources)
+            self.priors = np.vstack([self.priors, prior_matrix(sources)])
+
+    def url_ids(self, url: str) -> List[int]:
+        """Ids (não removidos) dos chunks cuja URL principal é url."""
+        with self._lock:
+            return [i for i, u in enumerate(self.meta) if u == url and i not in self.deleted]
+
+    def remove(self, ids: Iterable[int]):
+        """Marca chunks como removidos. Até a compactação eles ainda contam no IDF do BM25."""
+        if not self.mutable:
+            raise RuntimeError(f"shard '{self.name}' é somente leitura")
+        with self._lock:
+            self.deleted.update(int(i) for i in ids)
+
+    def docs(self, ids: Sequence[int]) -> List[Tuple[str, str]]:
+        """(texto, url) dos chunks pedidos."""
+        return [(self.texts[i], self.meta[i]) for i in ids]
+
+    def prior_rows(self, ids: Sequence[int]) -> np.ndarray:
+        return self.priors[np.asarray(ids, dtype=np.int64)]
+
+    def url_matches(self, needle: str) -> List[Tuple[int, str]]:
+        """
+        (id, url) dos chunks com alguma URL contendo needle. Olha todas as URLs
+        do chunk, não só a principal: a dedup junta espelhos e cópias num chunk só.
+        """
+        with self._lock:
+            out = []
+            for i, urls in enumerate(self.sources):
+                if i in self.deleted:
+                    continue
+                u = next((u for u in urls if needle in str(u)), None)
+                if u is not None:
+                    out.append((i, u))
+            return out
+
+    def find_url(self, needle: str) -> List[Tuple[str, str]]:
+        """(texto, url) dos chunks cuja URL contém needle (a URL devolvida é a que casou)."""
+        return [(self.texts[i], u) for i, u in self.url_matches(needle)]
+
+    def alive_ids(self) -> List[int]:
+        with self._lock:
+            return [i for i in range(len(self.texts)) if i not in self.deleted]
+
+    def term_stats(self, tokens: Sequence[str]) -> TermStats:
+        with self._lock:
+            return self.bm25.term_stats(tokens)
+
+    def search(self, q_emb: np.ndarray, tokens: Sequence[str], k: int, stats: TermStats | None = None):
+        """
+        Busca vetorial + BM25 no shard -> ((ids, scores), (ids, scores)) locais.
+        stats (ver corpus_stats) deixa o BM25 na mesma escala dos outros shards.
+        """
+        with self._lock:
+            n = len(self.texts)
+            if n == 0:
+                empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+                return empty, empty
+            # com tombstones, busca a mais e filtra
+            extra = len(self.deleted)
+            with stage(f"faiss:{self.name}"):
+                D, I = self.index.search(q_emb, min(k + extra, n))
+            valid = I[0] >= 0
+            if extra:
+                valid &= ~np.isin(I[0], list(self.deleted))
+            dense = (I[0][valid][:k], D[0][valid][:k])
+            with stage(f"bm25:{self.name}"):
+                ids, scores = self.bm25.search(tokens, k + extra, stats)
+            if extra:
+                keep = ~np.isin(ids, list(self.deleted))
+                ids, scores = ids[keep][:k], scores[keep][:k]
+            lexical = (ids, scores)
+        return dense, lexical
+
+
+def corpus_stats(shards: Iterable, tokens: Sequence[str]) -> TermStats:
+    """
+    N, tamanho total e df dos termos somados sobre todos os shards (não só os
+    consultados), para o BM25 de cada shard usar o IDF do corpus inteiro.
+    Shard que falhar fica de fora da soma.
+    """
+    parts = []
+    for sh in shards:
+        try:
+            parts.append(sh.term_stats(tokens))
+        except Exception as e:
+            logging.warning("[SHARD] %s: sem estatísticas do BM25: %s: %s", sh.name, type(e).__name__, e)
+    return merge_stats(parts)
+
+
+def merge_topk(per_shard: Dict[str, Tuple[np.ndarray, np.ndarray]], k: int):
+    """
+    Junta resultados de vários shards -> top-k global [(score, shard, id_local)].
+    Os scores precisam estar na mesma escala: cosseno, ou BM25 com corpus_stats.
+    """
+    merged = [
+        (float(score), name, int(i))
+        for name, (ids, scores) in per_shard.items()
+        for i, score in zip(ids, scores)
+    ]
+    merged.sort(key=lambda x: -x[0])
+    return merged[:k]
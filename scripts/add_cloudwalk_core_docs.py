@@ -1,13 +1,15 @@
 # scripts/add_cloudwalk_core_docs.py
 
+import sys
 import pathlib
-import hashlib
 import requests
 from bs4 import BeautifulSoup
 import re
 
-OUT = pathlib.Path("data/raw")
-OUT.mkdir(parents=True, exist_ok=True)
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from app.corpus import CorpusStore
+
+CORPUS = CorpusStore()
 
 HEADERS = {
     "User-Agent": (
@@ -60,10 +62,8 @@ def clean_html(html: str) -> str:
 
 
 def save_doc(url, text):
-    h = hashlib.md5(url.encode()).hexdigest()
-    fp = OUT / f"{h}.txt"
-    fp.write_text(url + "\n\n" + text, encoding="utf-8")
-    print("SALVO:", fp, "->", url)
+    changed = CORPUS.put(url, text)
+    print("SALVO:" if changed else "SEM MUDANÇA:", url)
 
 
 def fetch(url: str) -> str:
@@ -0,0 +1,20 @@
+import sys, pathlib, argparse
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from app.deps import get_store
+from app.rag import refresh_answer_bank
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Pré-computa respostas para as perguntas de app/config/faq_questions.json.")
+    ap.add_argument("--force", action="store_true", help="regera tudo, mesmo entradas da versão atual")
+    args = ap.parse_args()
+
+    s = get_store()
+    n = refresh_answer_bank(force=args.force)
+    print(f"Banco de respostas: {n} respostas gravadas (versão do índice {s.index_version}, "
+          f"{len(s.answer_bank)} entradas no total).")
+
+
+if __name__ == "__main__":
+    main()
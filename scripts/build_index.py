@@ -1,37 +1,82 @@
-import os, json, pathlib
+import os, sys, json, pathlib, argparse
 from sentence_transformers import SentenceTransformer
-import numpy as np, faiss
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from app.chunking import chunk, load_chunks
+from app.corpus import CorpusStore
+from app.dedup import dedup_chunks
+from app.manifest import read_manifest
+from app.shards import LIVE_SHARD, Shard, shard_for_url, write_shards_manifest
 
 RAW = pathlib.Path("data/raw")
-CHD = pathlib.Path("data/chunks"); CHD.mkdir(parents=True, exist_ok=True)
-IDX = pathlib.Path("index/faiss"); IDX.mkdir(parents=True, exist_ok=True)
+PAGES = pathlib.Path("data/chunks/pages")
+SHARDS = pathlib.Path("index/shards"); SHARDS.mkdir(parents=True, exist_ok=True)
 EMBED_MODEL = os.getenv("EMBED_MODEL","sentence-transformers/all-MiniLM-L6-v2")
+DEDUP = os.getenv("DEDUP_CHUNKS", "1").strip() != "0"
 
 def load_docs():
-    docs=[]
+    # corpus comprimido (leitura sequencial por segmento); data/raw só para URLs ainda não migradas
+    corpus=CorpusStore()
+    docs=list(corpus.iter_docs())
     for fp in RAW.glob("*.txt"):
         url, body = fp.read_text(encoding="utf-8").split("\n\n",1)
-        docs.append({"url":url, "text":body})
+        if url not in corpus and url not in corpus.deleted:   # apagada pelo recrawl: não volta pelo data/raw
+            docs.append({"url":url, "text":body})
     return docs
 
-def chunk(text, size=900, overlap=150):
-    words=text.split(); i=0; out=[]
-    while i < len(words):
-        out.append(" ".join(words[i:i+size])); i += (size-overlap)
-    return [t for t in out if len(t.split())>60]
+def doc_chunks(d):
+    # reaproveita os chunks calculados pelo scrape.py quando o texto não mudou
+    cached=load_chunks(PAGES, d["url"], d["text"])
+    return cached if cached is not None else chunk(d["text"])
 
 def main():
+    ap=argparse.ArgumentParser(description="Chunking + embeddings + índices (FAISS/BM25) por shard.")
+    ap.add_argument("--shard", action="append", default=[],
+                    help="reconstrói só este shard (pode repetir); os demais ficam como estão")
+    ap.add_argument("--changes", type=pathlib.Path,
+                    help="JSON do recrawl.py (data/crawl_changes.json): reconstrói só os shards alterados")
+    args=ap.parse_args()
+    only=set(args.shard)
+    if args.changes:
+        only |= set(json.loads(args.changes.read_text(encoding="utf-8")).get("shards", []))
+        if not only:
+            print("Nenhum shard alterado; nada a fazer."); return
+
     docs=load_docs()
-    texts, meta=[], []
+    texts, urls=[], []
     for d in docs:
-        for c in chunk(d["text"]):
-            texts.append(c); meta.append(d["url"])
+        if only and shard_for_url(d["url"]) not in only: continue
+        for c in doc_chunks(d):
+            texts.append(c); urls.append([d["url"]])
+    if DEDUP:
+        # quase-duplicatas (mirrors jina/textise, URLs repetidas) viram um chunk canônico
+        texts, urls, st = dedup_chunks(texts, urls)
+        pct = 100.0 * st["removed"] / max(st["before"], 1)
+        print(f"Dedup: {st['before']} -> {st['after']} chunks (-{st['removed']}, {pct:.1f}% menor).")
+
+    # cada chunk vai para o shard da sua URL canônica
+    groups={}
+    for i, u in enumerate(urls):
+        groups.setdefault(shard_for_url(u[0]), []).append(i)
+
     model=SentenceTransformer(EMBED_MODEL)
     embs=model.encode(texts, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
-    index=faiss.IndexFlatIP(embs.shape[1]); index.add(embs)
-    faiss.write_index(index, str(IDX/"index.faiss"))
-    (CHD/"texts.jsonl").write_text("\n".join(json.dumps({"text":t}) for t in texts), encoding="utf-8")
-    (CHD/"meta.jsonl").write_text("\n".join(json.dumps({"url":u}) for u in meta), encoding="utf-8")
-    print(f"Indexados {len(texts)} chunks.")
+
+    previous=dict(read_manifest(SHARDS).get("shards", {}))
+    versions=dict(previous) if only else {}
+    if LIVE_SHARD in previous:
+        versions[LIVE_SHARD]=previous[LIVE_SHARD]   # documentos de /admin/documents não vêm do scrape
+    for name in sorted(only - set(groups)):
+        print(f"AVISO: nenhum chunk para o shard '{name}'; removido do manifest.")
+        versions.pop(name, None)
+    for name, ids in sorted(groups.items()):
+        sh=Shard.from_embeddings(name, [texts[i] for i in ids], [urls[i] for i in ids], embs[ids])
+        sh.save(SHARDS/name, embed_model=EMBED_MODEL)
+        versions[name]=sh.version
+        print(f"Shard {name}: {len(sh)} chunks (versão {sh.version}).")
+
+    version=write_shards_manifest(SHARDS, versions, embed_model=EMBED_MODEL)
+    print(f"Indexados {len(texts)} chunks em {len(groups)} shard(s) (versão {version}).")
 if __name__=="__main__":
     main()
@@ -0,0 +1,107 @@
+"""
+Checagens rápidas da busca, sem LLM.
+
+    python scripts/check_search.py           # só o que não precisa do embedder
+    python scripts/check_search.py --store   # + checagens num Store (carrega o embedder; WAL temporário)
+
+Cada checagem levanta AssertionError com o motivo; o script sai com código 1
+se alguma falhar.
+"""
+import sys, shutil, pathlib, argparse, tempfile, traceback
+
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from app.lexical import tokenize
+from app.seed_dataset import SEED_DOCS
+from app.manifest import read_manifest
+from app.shards import LIVE_SHARD, Shard, corpus_stats, merge_topk, write_shards_manifest
+
+LIVE_DOC = {
+    "url": "https://example.com/check/politica-de-reembolso",
+    "text": (
+        "Política de reembolso da maquininha: o lojista pode pedir o estorno de uma "
+        "venda em até sete dias pelo aplicativo, e o valor volta para o cartão do comprador."
+    ),
+}
+
+
+def _shard(name, docs, dim=8, seed=0):
+    embs = np.random.default_rng(seed).random((len(docs), dim), dtype=np.float32)
+    return Shard.from_embeddings(name, [d["text"] for d in docs], [[d["url"]] for d in docs], embs, dim=dim)
+
+
+def check_bm25_merge_across_shards():
+    """Um match exato num shard pequeno tem que vencer o merge contra os outros shards."""
+    shards = {"seed": _shard("seed", SEED_DOCS), LIVE_SHARD: _shard(LIVE_SHARD, [LIVE_DOC], seed=1)}
+    tokens = tokenize("política de reembolso da maquininha")
+    stats = corpus_stats(shards.values(), tokens)
+    q = np.zeros((1, 8), dtype=np.float32)
+    lexical = {name: sh.search(q, tokens, 4, stats)[1] for name, sh in shards.items()}
+    merged = merge_topk(lexical, 4)
+    assert merged, "nenhum resultado lexical"
+    assert all(score > 0 for score, _, _ in merged), f"score BM25 não positivo no merge: {merged}"
+    score, name, i = merged[0]
+    assert (name, i) == (LIVE_SHARD, 0), f"esperava o documento do shard live no topo, veio {merged}"
+    print(f"ok: merge BM25 entre shards (topo {name}:{i}, score {score:.3f})")
+
+
+def _scratch_shards(src: pathlib.Path, dst: pathlib.Path):
+    """
+    dst com os shards de src por symlink (só leitura) e um manifest próprio,
+    sem o shard live: o Store da checagem cria o seu em dst.
+    """
+    dst.mkdir(parents=True)
+    manifest = read_manifest(src)
+    versions = {n: v for n, v in manifest.get("shards", {}).items() if n != LIVE_SHARD}
+    for name in versions:
+        (dst / name).symlink_to((src / name).resolve(), target_is_directory=True)
+    if versions:
+        write_shards_manifest(dst, versions, embed_model=manifest.get("embed_model"))
+
+
+def check_live_upsert_retrieve():
+    """
+    Documento enviado via upsert_document tem que sair no retrieve() logo em
+    seguida. Roda num Store com os shards reais, mas com WAL e shard live num
+    diretório temporário: não disputa data/wal.jsonl nem a compactação com a
+    API, se ela estiver rodando.
+    """
+    from app import deps
+    from app.rag import retrieve
+
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="check_search-"))
+    try:
+        _scratch_shards(deps.SHARDS_DIR, tmp / "shards")
+        s = deps.STORE = deps.Store(shards_dir=tmp / "shards", wal_path=tmp / "wal.jsonl")
+        s.upsert_document(LIVE_DOC["url"], LIVE_DOC["text"])
+        hits = retrieve("Qual é a política de reembolso da maquininha?")
+        urls = [h.url for h in hits]
+        assert LIVE_DOC["url"] in urls, f"documento recém-indexado fora do retrieve(): {urls}"
+        print(f"ok: upsert + retrieve (posição {urls.index(LIVE_DOC['url']) + 1} de {len(urls)})")
+    finally:
+        deps.STORE = None
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Checagens rápidas da busca.")
+    ap.add_argument("--store", action="store_true", help="inclui checagens no Store real (carrega o embedder)")
+    args = ap.parse_args()
+
+    checks = [check_bm25_merge_across_shards]
+    if args.store:
+        checks.append(check_live_upsert_retrieve)
+    failed = 0
+    for check in checks:
+        try:
+            check()
+        except Exception:
+            failed += 1
+            print(f"FALHOU: {check.__name__}")
+            traceback.print_exc()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
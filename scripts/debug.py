@@ -8,6 +8,8 @@ def debug_core_docs():
     - missão (#our-mission)
     - pilares (#our-pillars)
     - código de ética (code-of-ethics-and-conduct)
+
+    Sobe o Store inteiro; para só olhar o índice em disco, use inspect_index.py.
     """
     s = get_store()
     targets = (
@@ -71,9 +73,9 @@ def debug_retrieve_examples():
     for q in questions:
         print("=== RETRIEVE PARA:", q, "===")
         hits = retrieve(q, k=6)
-        for j, (t, url) in enumerate(hits, 1):
-            print(f"[{j}] URL:", url)
-            print("TRECHO:", t[:400].replace("\n", " "))
+        for j, h in enumerate(hits, 1):
+            print(f"[{j}] URL:", h.url, f"(score {h.score:.3f})")
+            print("TRECHO:", h.text[:400].replace("\n", " "))
             print("-----")
         print()
 
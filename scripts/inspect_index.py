@@ -0,0 +1,275 @@
+"""
+Inspeção do índice em disco, sem subir o Store.
+
+Abre só os artefatos de index/shards/<nome>/ (meta.jsonl, texts.jsonl e o
+BM25 em bm25/, via mmap, somente leitura). Não importa app.deps: não carrega
+SentenceTransformer, não exige OPENAI_API_KEY e nunca dispara scrape/build.
+O embedder (e o FAISS) só são carregados no comando "vector".
+
+    python scripts/inspect_index.py stats
+    python scripts/inspect_index.py url our-mission
+    python scripts/inspect_index.py term "Customer Engagement"
+    python scripts/inspect_index.py bm25 "missão da cloudwalk" -k 5
+    python scripts/inspect_index.py chunk cloudwalk 12
+    python scripts/inspect_index.py vector "quais são os pilares?"   # carrega o embedder
+
+--shard, --limit e --full valem antes ou depois do comando
+(`url our-mission --full`). Documentos do shard live ainda no WAL
+(data/wal.jsonl, antes da compactação) não aparecem.
+"""
+import sys, json, mmap, time, string, pathlib, argparse
+
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from app.lexical import LexicalIndex, merge_stats, tokenize
+from app.manifest import read_manifest
+
+SHARDS = pathlib.Path("index/shards")
+SNIPPET = 300
+
+
+class JsonlView:
+    """Linhas de um .jsonl via mmap; só a linha pedida é decodificada."""
+
+    def __init__(self, fp: pathlib.Path):
+        self._fh = open(fp, "rb")
+        size = fp.stat().st_size
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        buf = np.frombuffer(self._mm, dtype=np.uint8) if size else np.empty(0, dtype=np.uint8)
+        ends = np.flatnonzero(buf == ord("\n"))
+        if size and (not len(ends) or ends[-1] != size - 1):
+            ends = np.append(ends, size)     # última linha sem \n
+        self._starts = np.concatenate([[0], ends[:-1] + 1]) if len(ends) else ends
+        self._ends = ends
+
+    def __len__(self):
+        return len(self._ends)
+
+    def raw(self, i: int) -> bytes:
+        return self._mm[self._starts[i]:self._ends[i]]
+
+    def get(self, i: int) -> dict:
+        return json.loads(self.raw(i))
+
+
+class ShardView:
+    def __init__(self, name: str, path: pathlib.Path):
+        self.name, self.path = name, path
+        self.manifest = read_manifest(path)
+        self.version = self.manifest.get("version")
+        self.texts = JsonlView(path / "texts.jsonl")
+        self.meta = JsonlView(path / "meta.jsonl")
+        self._bm25 = None
+
+    @property
+    def bm25(self) -> LexicalIndex | None:
+        if self._bm25 is None:
+            bm25_dir = self.path / "bm25"
+            stored = LexicalIndex.stored_version(bm25_dir)
+            if stored is None:
+                return None
+            if stored != self.version:
+                print(f"AVISO: BM25 de {self.name} é de outra versão ({stored} != {self.version}).")
+            self._bm25 = LexicalIndex.load(bm25_dir, mmap=True)
+        return self._bm25
+
+    def url(self, i: int) -> str:
+        return self.meta.get(i)["url"]
+
+    def urls(self, i: int) -> list[str]:
+        m = self.meta.get(i)
+        return m.get("urls") or [m["url"]]
+
+    def text(self, i: int) -> str:
+        return self.texts.get(i)["text"]
+
+
+def open_shards(only: list[str]) -> list[ShardView]:
+    names = list(read_manifest(SHARDS).get("shards", {}))
+    if not names:
+        sys.exit(f"Nenhum shard em {SHARDS}/manifest.json. Rode scripts/build_index.py.")
+    if only:
+        missing = set(only) - set(names)
+        if missing:
+            sys.exit(f"Shard(s) fora do manifest: {', '.join(sorted(missing))}")
+        names = [n for n in names if n in only]
+    return [ShardView(n, SHARDS / n) for n in names]
+
+
+def show(sh: ShardView, i: int, score: float | None = None, full: bool = False, url: str | None = None):
+    head = f"[{sh.name}:{i}]" + (f" score={score:.4f}" if score is not None else "")
+    print(head, url or sh.url(i))
+    text = sh.text(i)
+    print("TRECHO:", (text if full else text[:SNIPPET]).replace("\n", " "))
+    print("-----")
+
+
+# ---------- comandos ----------
+
+def cmd_stats(shards, args):
+    m = read_manifest(SHARDS)
+    print(f"Índice: versão {m.get('version')}, {len(m.get('shards', {}))} shard(s), "
+          f"embed_model={m.get('embed_model')}")
+    total = 0
+    for sh in shards:
+        sizes = {p.name: p.stat().st_size for p in sh.path.rglob("*") if p.is_file()}
+        line = (f"- {sh.name}: {len(sh.texts)} chunks, versão {sh.version}, "
+                f"{sum(sizes.values()) / 1e6:.1f} MB em disco")
+        if sh.bm25 is not None:
+            b = sh.bm25
+            line += (f", vocabulário {len(b.terms)}, {len(b._doc_ids)} postings, "
+                     f"{float(np.mean(b._doc_len)) if b.n_docs else 0:.0f} tokens/chunk")
+        print(line)
+        total += len(sh.texts)
+    print(f"Total: {total} chunks.")
+    corpus = pathlib.Path("data/corpus")
+    if corpus.exists():
+        from app.corpus import CorpusStore
+        print("Corpus:", CorpusStore(corpus).stats())
+
+
+def cmd_url(shards, args):
+    # meta.jsonl é gravado com json.dumps (ensure_ascii): acento vira \uXXXX nos bytes da linha
+    needle = json.dumps(args.text)[1:-1].encode("ascii")
+    n = 0
+    for sh in shards:
+        for i in range(len(sh.meta)):
+            # filtro barato nos bytes da linha; confirma no JSON decodificado (em todas as URLs do chunk)
+            if needle not in sh.meta.raw(i):
+                continue
+            url = next((u for u in sh.urls(i) if args.text in u), None)
+            if url is not None:
+                show(sh, i, full=args.full, url=url)
+                n += 1
+                if n >= args.limit:
+                    return
+    if not n:
+        print(f"Nenhum chunk com URL contendo '{args.text}'.")
+
+
+_PUNCT = string.punctuation + "“”‘’«»…"
+
+
+def _norm(term: str) -> str:
+    return term.strip(_PUNCT).lower()
+
+
+def _term_docs(bm25: LexicalIndex, word: str) -> np.ndarray:
+    """Docs com qualquer variante do termo (maiúsculas/pontuação colada), pelas postings."""
+    target = _norm(word)
+    ids = [t for t, term in enumerate(bm25.terms) if _norm(term) == target and t < bm25._base_terms]
+    parts = [np.asarray(bm25._doc_ids[bm25._indptr[t]:bm25._indptr[t + 1]]) for t in ids]
+    return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+
+def cmd_term(shards, args):
+    words = tokenize(args.text)
+    if not words:
+        sys.exit("Termo vazio.")
+    n = 0
+    for sh in shards:
+        if sh.bm25 is None:
+            print(f"AVISO: {sh.name} sem BM25 em disco; pulando.")
+            continue
+        docs = _term_docs(sh.bm25, words[0])
+        for w in words[1:]:
+            docs = np.intersect1d(docs, _term_docs(sh.bm25, w))
+        for i in docs.tolist():
+            # várias palavras: confere a frase no texto (as postings não têm posição)
+            if len(words) > 1 and args.text.lower() not in sh.text(i).lower():
+                continue
+            show(sh, i, full=args.full)
+            n += 1
+            if n >= args.limit:
+                return
+    if not n:
+        print(f"O termo '{args.text}' não aparece em nenhum chunk.")
+
+
+def cmd_bm25(shards, args):
+    tokens = tokenize(args.text)
+    # IDF e avgdl do corpus inteiro, como no Store: scores comparáveis entre shards
+    everyone = open_shards([]) if args.shard else shards
+    stats = merge_stats(sh.bm25.term_stats(tokens) for sh in everyone if sh.bm25 is not None)
+    hits = []
+    for sh in shards:
+        if sh.bm25 is None:
+            continue
+        ids, scores = sh.bm25.search(tokens, args.k, stats)
+        hits += [(float(s), sh, int(i)) for i, s in zip(ids, scores)]
+    hits.sort(key=lambda h: -h[0])
+    for score, sh, i in hits[:args.k]:
+        show(sh, i, score, full=args.full)
+
+
+def cmd_vector(shards, args):
+    import faiss
+    from sentence_transformers import SentenceTransformer
+
+    model_name = read_manifest(SHARDS).get("embed_model") or "sentence-transformers/all-MiniLM-L6-v2"
+    t0 = time.perf_counter()
+    model = SentenceTransformer(model_name)
+    q = model.encode([args.text], convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+    print(f"(embedder {model_name} carregado em {time.perf_counter() - t0:.1f}s)")
+    hits = []
+    for sh in shards:
+        fp = str(sh.path / "index.faiss")
+        try:
+            index = faiss.read_index(fp, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:   # nem todo tipo de índice aceita mmap
+            index = faiss.read_index(fp)
+        if index.ntotal == 0:
+            continue
+        D, I = index.search(q, min(args.k, index.ntotal))
+        hits += [(float(s), sh, int(i)) for i, s in zip(I[0], D[0]) if i >= 0]
+    hits.sort(key=lambda h: -h[0])
+    for score, sh, i in hits[:args.k]:
+        show(sh, i, score, full=args.full)
+
+
+def cmd_chunk(shards, args):
+    sh = next((s for s in shards if s.name == args.shard_name), None)
+    if sh is None:
+        sys.exit(f"Shard '{args.shard_name}' não encontrado.")
+    if not 0 <= args.id < len(sh.texts):
+        sys.exit(f"id fora do shard (0..{len(sh.texts) - 1}).")
+    m = sh.meta.get(args.id)
+    if len(m.get("urls") or []) > 1:
+        print("URLs:", ", ".join(m["urls"]))
+    show(sh, args.id, full=True)
+
+
+def main():
+    def common(parser, defaults: bool):
+        # nos subcomandos sem default, para não sobrescrever o que veio antes do comando
+        d = (lambda v: v) if defaults else (lambda v: argparse.SUPPRESS)
+        parser.add_argument("--shard", action="append", default=d([]), help="limita a este shard (pode repetir)")
+        parser.add_argument("--limit", type=int, default=d(20), help="máximo de chunks listados (url/term)")
+        parser.add_argument("--full", action="store_true", default=d(False), help="mostra o chunk inteiro")
+
+    ap = argparse.ArgumentParser(description="Inspeção somente leitura do índice em disco.")
+    common(ap, defaults=True)
+    opts = argparse.ArgumentParser(add_help=False)
+    common(opts, defaults=False)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats", parents=[opts], help="tamanho, versão e vocabulário de cada shard")
+    p = sub.add_parser("url", parents=[opts], help="chunks com alguma URL contendo o texto"); p.add_argument("text")
+    p = sub.add_parser("term", parents=[opts], help="chunks que contêm o termo/frase (via postings do BM25)")
+    p.add_argument("text")
+    for name, helptext in (("bm25", "busca só BM25"), ("vector", "busca vetorial (carrega o embedder)")):
+        p = sub.add_parser(name, parents=[opts], help=helptext)
+        p.add_argument("text"); p.add_argument("-k", type=int, default=6)
+    p = sub.add_parser("chunk", parents=[opts], help="um chunk inteiro por shard e id")
+    p.add_argument("shard_name"); p.add_argument("id", type=int)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    shards = open_shards(args.shard)
+    {"stats": cmd_stats, "url": cmd_url, "term": cmd_term, "bm25": cmd_bm25,
+     "vector": cmd_vector, "chunk": cmd_chunk}[args.cmd](shards, args)
+    print(f"({(time.perf_counter() - t0) * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Servidor OpenAI-compatível de mentira, para testar hedging / circuit breaker
+/ fallback do app/llm.py sem depender de provedor real.
+
+Exemplo (dois backends locais, o primeiro lento):
+
+    python scripts/llm_stub_server.py --port 9001 --ttft 5 --name lento
+    python scripts/llm_stub_server.py --port 9002 --ttft 0.2 --name rapido
+
+    LLM_BACKENDS='[{"name":"lento","base_url":"http://127.0.0.1:9001/v1","model":"stub"},
+                   {"name":"rapido","base_url":"http://127.0.0.1:9002/v1","model":"stub"}]'
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(args):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *a):
+            print(f"[{args.name}] " + fmt % a)
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                return self._send_json(404, {"error": {"message": "not found"}})
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+            if random.random() < args.error_rate:
+                return self._send_json(500, {"error": {"message": f"{args.name}: erro simulado"}})
+
+            time.sleep(args.ttft)
+            words = f"Resposta do backend {args.name} [1].".split()
+            usage = {"prompt_tokens": 10, "completion_tokens": len(words), "total_tokens": 10 + len(words)}
+            model = req.get("model", "stub")
+
+            if not req.get("stream"):
+                return self._send_json(200, {
+                    "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": " ".join(words)}}],
+                    "usage": usage,
+                })
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+
+            def event(delta=None, finish=None, with_usage=False):
+                chunk = {"id": "stub", "object": "chat.completion.chunk",
+                         "created": int(time.time()), "model": model, "choices": []}
+                if delta is not None or finish:
+                    chunk["choices"] = [{"index": 0, "delta": delta or {}, "finish_reason": finish}]
+                if with_usage:
+                    chunk["usage"] = usage
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            try:
+                for i, w in enumerate(words):
+                    event({"content": (" " if i else "") + w})
+                    time.sleep(args.token_delay)
+                event(finish="stop")
+                if (req.get("stream_options") or {}).get("include_usage"):
+                    event(with_usage=True)
+                self.wfile.write(b"data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                print(f"[{args.name}] cliente fechou o stream (hedge perdido)")
+
+    return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Stub OpenAI-compatível para testes locais.")
+    ap.add_argument("--port", type=int, default=9001)
+    ap.add_argument("--name", default="stub")
+    ap.add_argument("--ttft", type=float, default=0.2, help="atraso (s) até o primeiro token")
+    ap.add_argument("--token-delay", type=float, default=0.02)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fração de requisições com HTTP 500")
+    args = ap.parse_args()
+    print(f"[{args.name}] ouvindo em http://127.0.0.1:{args.port}/v1")
+    ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args)).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
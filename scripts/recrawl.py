@@ -0,0 +1,220 @@
+"""
+Recrawl incremental guiado por sitemaps.
+
+Em vez de raspar tudo de novo a cada execução (scrape.py), este script:
+- lê os sitemaps (inclusive sitemap index) e o <lastmod> de cada URL;
+- mantém um estado por URL em data/crawl_state.json (última coleta, hash do
+  conteúdo, ETag/Last-Modified, intervalo estimado de mudança);
+- em cada execução busca só as URLs novas, com lastmod diferente ou cujo
+  intervalo venceu, usando GET condicional (If-None-Match / If-Modified-Since);
+- o intervalo de cada URL dobra quando ela não muda e cai pela metade quando
+  muda, então o custo acompanha a taxa de mudança e não o tamanho do site;
+- URLs que respondem 404/410, ou que já estiveram no sitemap e saíram dele, são
+  apagadas do corpus (CorpusStore.delete) e do estado;
+- grava as URLs alteradas e removidas em data/crawl_changes.json. Com --build,
+  reconstrói só os shards afetados (build_index.py --shard ...).
+
+    python scripts/recrawl.py            # coleta o que está vencido
+    python scripts/recrawl.py --build    # ... e reindexa os shards alterados
+"""
+import sys, json, time, hashlib, pathlib, argparse, subprocess
+from urllib.parse import urlparse
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+from scrape import (
+    START_URLS, HEADERS, CONNECT_TIMEOUT, READ_TIMEOUT, SLEEP_BETWEEN,
+    session, _ok, _save, _delete, _corpus_store, _parse_sitemap, _text_from_html,
+)
+from app.shards import shard_for_url
+
+STATE_PATH = pathlib.Path("data/crawl_state.json")
+CHANGES_PATH = pathlib.Path("data/crawl_changes.json")
+
+MIN_INTERVAL = 6 * 3600          # 6h
+MAX_INTERVAL = 30 * 24 * 3600    # 30 dias
+START_INTERVAL = 24 * 3600       # 1 dia para URLs novas
+MAX_FETCHES = 200
+
+
+def sitemap_urls() -> list[str]:
+    """Sitemaps explícitos do START_URLS + /sitemap.xml de cada host permitido."""
+    out = [u for u in START_URLS if u.lower().endswith(".xml")]
+    for u in START_URLS:
+        p = urlparse(u)
+        if p.netloc and "jina" not in p.netloc and "textise" not in p.netloc:
+            guess = f"{p.scheme}://{p.netloc}/sitemap.xml"
+            if guess not in out:
+                out.append(guess)
+    return out
+
+
+def load_state() -> dict:
+    if STATE_PATH.exists():
+        return json.loads(STATE_PATH.read_text(encoding="utf-8"))
+    return {}
+
+
+def save_state(state: dict):
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=1), encoding="utf-8")
+    tmp.replace(STATE_PATH)
+
+
+def discover() -> tuple[dict[str, str | None], set[str]]:
+    """
+    -> (URL sem fragmento -> lastmod do sitemap (None se não veio de sitemap),
+        URLs que vieram de sitemap).
+    """
+    found: dict[str, str | None] = {}
+    listed: set[str] = set()
+    for sm in sitemap_urls():
+        entries = _parse_sitemap(sm)
+        print(f"Sitemap {sm}: {len(entries)} URLs")
+        for loc, lastmod in entries:
+            base = loc.split("#", 1)[0]
+            if _ok(base):
+                found[base] = lastmod
+                listed.add(base)
+    for u in START_URLS:
+        base = u.split("#", 1)[0]
+        if not base.lower().endswith(".xml") and _ok(base):
+            found.setdefault(base, None)
+    return found, listed
+
+
+def is_due(st: dict | None, lastmod: str | None, now: float) -> bool:
+    if not st:
+        return True
+    if lastmod and lastmod != st.get("lastmod"):
+        return True
+    return now >= st.get("last_fetch", 0) + st.get("interval", START_INTERVAL)
+
+
+def check(url: str, st: dict) -> tuple[str, str | None]:
+    """
+    Verifica uma URL. Retorna (status, texto) com status em
+    'not_modified' | 'unchanged' | 'changed' | 'gone' (404/410) | 'failed'.
+    """
+    headers = dict(HEADERS)
+    if st.get("etag"):
+        headers["If-None-Match"] = st["etag"]
+    if st.get("last_modified"):
+        headers["If-Modified-Since"] = st["last_modified"]
+    try:
+        r = session.get(url, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    except Exception:
+        return "failed", None
+    if r.status_code == 304:
+        return "not_modified", None
+    if r.status_code in (404, 410):
+        return "gone", None
+    if r.status_code != 200:
+        return "failed", None
+
+    # o hash é do texto extraído: HTML muda por detalhes (tokens, scripts) que não interessam.
+    # O HTML já baixado é reaproveitado; só CloudWalk (ou página sem texto) vai à Jina.
+    text = _text_from_html(url, r.headers.get("Content-Type", ""), r.text)
+    if not text:
+        # sem gravar ETag/Last-Modified: senão a próxima execução recebe 304 e a página nunca entra
+        return "failed", None
+    st["etag"] = r.headers.get("ETag")
+    st["last_modified"] = r.headers.get("Last-Modified")
+    h = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    if h == st.get("content_hash"):
+        return "unchanged", None
+    st["content_hash"] = h
+    return "changed", text
+
+
+def _remove(base: str, state: dict, corpus_urls: set[str]) -> list[str]:
+    """Apaga do corpus e do estado a URL e as variantes com fragmento (#...) dela."""
+    urls = [u for u in corpus_urls | set(state) if u.split("#", 1)[0] == base]
+    for u in urls:
+        _delete(u)
+        state.pop(u, None)
+        corpus_urls.discard(u)
+    return urls
+
+
+def run(max_fetches: int = MAX_FETCHES) -> list[str]:
+    """Coleta o que está vencido; retorna as URLs alteradas ou removidas."""
+    state = load_state()
+    now = time.time()
+    found, listed = discover()
+
+    # já estiveram no sitemap e saíram: a página foi tirada do site. Só conta em host
+    # cujo sitemap respondeu nesta execução (sitemap fora do ar não apaga o site inteiro);
+    # páginas que o scrape.py achou por links, fora do sitemap, não entram nessa regra
+    hosts = {urlparse(u).netloc for u in listed}
+    corpus_urls = set(_corpus_store().urls)
+    gone = [
+        u for u, st in state.items()
+        if st.get("sitemap") and u not in found and urlparse(u).netloc in hosts
+    ]
+    removed = [r for u in gone for r in _remove(u, state, corpus_urls)]
+    for u in listed:
+        if u in state:
+            state[u]["sitemap"] = True
+    if removed:
+        print(f"{len(removed)} URLs fora do sitemap removidas do corpus.")
+
+    due = [u for u, lm in found.items() if is_due(state.get(u), lm, now)]
+    # nunca vistas primeiro, depois as mais atrasadas
+    due.sort(key=lambda u: state.get(u, {}).get("last_fetch", 0) + state.get(u, {}).get("interval", 0))
+    print(f"{len(found)} URLs conhecidas, {len(due)} vencidas/alteradas; buscando até {max_fetches}.")
+
+    changed, counts = [], {}
+    for url in due[:max_fetches]:
+        st = state.setdefault(url, {"interval": START_INTERVAL, "changes": 0, "checks": 0})
+        st["sitemap"] = url in listed
+        status, text = check(url, st)
+        counts[status] = counts.get(status, 0) + 1
+        st["checks"] += 1
+        if status == "failed":
+            continue
+        if status == "gone":
+            removed += _remove(url, state, corpus_urls)
+            continue
+        st["last_fetch"] = now
+        st["lastmod"] = found.get(url)
+        if status == "changed":
+            _save(url, text, etag=st.get("etag"), last_modified=st.get("last_modified"))
+            changed.append(url)
+            st["changes"] += 1
+            st["interval"] = max(MIN_INTERVAL, st["interval"] // 2)
+        else:
+            st["interval"] = min(MAX_INTERVAL, st["interval"] * 2)
+        time.sleep(SLEEP_BETWEEN)
+
+    save_state(state)
+    CHANGES_PATH.write_text(json.dumps({
+        "run_at": int(now),
+        "changed": changed,
+        "removed": removed,
+        "shards": sorted({shard_for_url(u) for u in changed + removed}),
+    }, ensure_ascii=False, indent=1), encoding="utf-8")
+    print("Resultado:", ", ".join(f"{k}={v}" for k, v in sorted(counts.items())) or "nada a fazer")
+    print(f"{len(changed)} documentos alterados, {len(removed)} removidos -> {CHANGES_PATH}")
+    return changed + removed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Recrawl incremental guiado por sitemaps.")
+    ap.add_argument("--max-fetches", type=int, default=MAX_FETCHES)
+    ap.add_argument("--build", action="store_true", help="reconstrói só os shards com documentos alterados/removidos")
+    args = ap.parse_args()
+
+    changed = run(args.max_fetches)
+    if args.build and changed:
+        shards = sorted({shard_for_url(u) for u in changed})
+        cmd = [sys.executable, str(pathlib.Path(__file__).with_name("build_index.py"))]
+        for sh in shards:
+            cmd += ["--shard", sh]
+        print("Reindexando shards:", ", ".join(shards))
+        subprocess.run(cmd, check=True)
+
+
+if __name__ == "__main__":
+    main()
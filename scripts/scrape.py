@@ -1,10 +1,34 @@
-import pathlib, re, time, hashlib, os
+"""
+Crawler das fontes públicas (CloudWalk / InfinitePay) -> data/corpus/ (app/corpus.py).
+
+A coleta é um pipeline de etapas ligadas por filas limitadas:
+
+    fetch (threads, I/O) -> extract (processos, CPU) -> chunk -> write
+
+- fetch: até MAX_WORKERS downloads simultâneos, no máximo PER_HOST_LIMIT por
+  host e MAX_IN_FLIGHT páginas no pipeline;
+- extract: um único parse por página gera o texto limpo e os links, num pool
+  de processos (lxml se estiver instalado, senão html.parser);
+- chunk: divide o texto como o build_index.py faz (app/chunking.py);
+- write: grava o texto no corpus comprimido (data/corpus/) e os chunks em
+  data/chunks/pages/<md5>.json.
+
+No fim (e a cada PROGRESS_EVERY segundos) cada etapa informa itens/s e a
+ocupação dos seus workers, para mostrar qual delas é o gargalo.
+"""
+import sys, pathlib, re, time, os, queue, threading, importlib.util
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
 import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from app.chunking import chunk, save_chunks
+from app.corpus import CorpusStore
+
 # ---------- CONFIG ----------
 START_URLS = [
     "https://www.cloudwalk.io/",
@@ -45,7 +69,12 @@ HEADERS = {
     "Accept-Language": "pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7",
 }
 ALLOWED_HOSTS = {urlparse(u).netloc for u in START_URLS}
-OUT = pathlib.Path("data/raw"); OUT.mkdir(parents=True, exist_ok=True)
+CHUNKS_OUT = pathlib.Path("data/chunks/pages")
+JINA = "https://r.jina.ai/"
+PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+EXTRACT_WORKERS = int(os.getenv("SCRAPE_EXTRACT_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+QUEUE_SIZE = 64
+PROGRESS_EVERY = 10
 
 
 session = requests.Session()
@@ -58,8 +87,7 @@ session.mount("http://", HTTPAdapter(max_retries=retry))
 session.mount("https://", HTTPAdapter(max_retries=retry))
 
 
-def _clean(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
+def _soup_text(soup) -> str:
     for t in soup(["script","style","noscript"]): t.extract()
     for sel in ["header","nav","footer",".cookie",".cookies",".newsletter"]:
         [x.extract() for x in soup.select(sel)]
@@ -67,6 +95,43 @@ def _clean(html: str) -> str:
     text = re.sub(r"\s{2,}", " ", text)
     return text
 
+def _clean(html: str) -> str:
+    return _soup_text(BeautifulSoup(html, PARSER))
+
+def _extract_page(base: str, html: str) -> tuple[str, list[str]]:
+    """Um único parse: links (antes de remover nav/header/footer) e texto limpo."""
+    soup = BeautifulSoup(html, PARSER)
+    links = [urljoin(base, a["href"]) for a in soup.find_all("a", href=True)]
+    return _soup_text(soup), links
+
+def _parse_sitemap(url: str, depth: int = 0) -> list[tuple[str, str | None]]:
+    """Lê um sitemap.xml (ou sitemap index, recursivamente) -> [(loc, lastmod)]."""
+    try:
+        r = session.get(url, headers=HEADERS, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        if r.status_code != 200:
+            return []
+        root = ET.fromstring(r.content)
+    except Exception:
+        return []
+    kind = root.tag.rsplit("}", 1)[-1]      # urlset | sitemapindex (ignora o namespace)
+    out = []
+    for node in root:
+        loc = lastmod = None
+        for child in node:
+            name = child.tag.rsplit("}", 1)[-1]
+            if name == "loc":
+                loc = (child.text or "").strip()
+            elif name == "lastmod":
+                lastmod = (child.text or "").strip() or None
+        if not loc:
+            continue
+        if kind == "sitemapindex":
+            if depth < 3:
+                out.extend(_parse_sitemap(loc, depth + 1))
+        else:
+            out.append((loc, lastmod))
+    return out
+
 def _ok(url:str)->bool:
     net = urlparse(url).netloc
     if net not in ALLOWED_HOSTS: return False
@@ -74,41 +139,28 @@ def _ok(url:str)->bool:
         return False
     return True
 
-def _save(url, text):
-    h = hashlib.md5(url.encode()).hexdigest()
-    (OUT / f"{h}.txt").write_text(url + "\n\n" + text, encoding="utf-8")
+_corpus = None
+
+def _corpus_store() -> CorpusStore:
+    # aberto sob demanda: os processos do pool de extração também importam este módulo
+    global _corpus
+    if _corpus is None:
+        _corpus = CorpusStore()
+    return _corpus
+
+def _save(url, text, **meta):
+    _corpus_store().put(url, text, **meta)
+
+def _delete(url):
+    _corpus_store().delete(url)
 
 def _fetch_raw(url: str) -> tuple[int, str, str]:
     """Retorna (status, content_type, text) sem renderização JS."""
     r = session.get(url, headers=HEADERS, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
     return r.status_code, r.headers.get("Content-Type",""), r.text
 
-def _fetch_with_fallback(url: str) -> str | None:
-    netloc = urlparse(url).netloc
-
-    # Para CloudWalk, força Jina (melhor texto para RAG)
-    if "cloudwalk.io" in netloc:
-        try:
-            prox = f"https://r.jina.ai/{url}"
-            r = session.get(prox, headers=HEADERS, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
-            if r.status_code == 200:
-                txt = _clean(r.text)
-                if len(txt) >= 200:
-                    return txt
-        except Exception:
-            pass
-        return None  # se der ruim, deixa sem texto mesmo
-
-    # Para outros domínios, mantém lógica antiga (HTML normal + fallback)
-    try:
-        status, ctype, html = _fetch_raw(url)
-        if status == 200 and "text/html" in ctype:
-            txt = _clean(html)
-            if len(txt) >= 300:
-                return txt
-    except Exception:
-        pass
-
+def _fetch_jina(url: str) -> str | None:
+    """Texto da página via Jina (renderiza JS); None se vier curto ou falhar."""
     try:
         prox = f"https://r.jina.ai/{url}"
         r = session.get(prox, headers=HEADERS, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
@@ -118,33 +170,223 @@ def _fetch_with_fallback(url: str) -> str | None:
                 return txt
     except Exception:
         pass
-
     return None
 
+def _text_from_html(url: str, ctype: str, html: str) -> str | None:
+    """
+    Texto de um HTML já baixado; se render pouco texto, cai para a Jina.
+    Para CloudWalk a Jina é sempre usada (melhor texto para RAG).
+    """
+    if "cloudwalk.io" in urlparse(url).netloc:
+        return _fetch_jina(url)
+    if "text/html" in ctype:
+        txt = _clean(html)
+        if len(txt) >= 300:
+            return txt
+    return _fetch_jina(url)
+
+# ---------- PIPELINE ----------
+class StageStats:
+    def __init__(self, name: str, workers: int):
+        self.name, self.workers = name, workers
+        self.items = 0
+        self.busy = 0.0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, secs: float, nbytes: int = 0):
+        with self._lock:
+            self.items += 1; self.busy += secs; self.bytes += nbytes
+
+    def line(self, wall: float) -> tuple[float, str]:
+        util = self.busy / max(wall * self.workers, 1e-9)
+        rate = self.items / max(wall, 1e-9)
+        return util, (f"  {self.name:<8} {self.items:>5} itens  {rate:7.2f}/s  "
+                      f"{self.busy / max(self.items, 1) * 1000:8.1f} ms/item  "
+                      f"ocupação {util * 100:5.1f}% de {self.workers} worker(s)")
+
+
+def _report(stats: list[StageStats], started: float, queues: dict | None = None):
+    wall = time.perf_counter() - started
+    lines = [st.line(wall) for st in stats]
+    print(f"[PIPELINE] {wall:.1f}s")
+    for _, line in lines:
+        print(line)
+    if queues:
+        print("  filas:", ", ".join(f"{k}={q.qsize()}" for k, q in queues.items()))
+    slowest = max(range(len(stats)), key=lambda i: lines[i][0])
+    print(f"  gargalo: {stats[slowest].name}")
+
+
+def _fetch(url: str, mode: str) -> dict:
+    """
+    mode='page': CloudWalk -> texto via Jina + HTML (para os links); demais -> HTML.
+    mode='jina': só o texto via Jina (fallback quando o HTML não rende texto).
+    """
+    out = {"html": None, "jina": None, "bytes": 0}
+    if mode == "jina" or "cloudwalk.io" in urlparse(url).netloc:
+        r = session.get(JINA + url, headers=HEADERS, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        if r.status_code == 200:
+            out["jina"] = r.text; out["bytes"] += len(r.content)
+    if mode == "page":
+        status, ctype, html = _fetch_raw(url.split("#", 1)[0])
+        if status == 200 and "text/html" in ctype:
+            out["html"] = html; out["bytes"] += len(html)
+    return out
+
+
+def _extract(html: str | None, jina: str | None, base: str) -> tuple[str | None, list[str], float]:
+    """Roda no pool de processos: (texto ou None se curto demais, links, segundos)."""
+    t0 = time.perf_counter()
+    text, links = None, []
+    if html:
+        txt, links = _extract_page(base, html)
+        if len(txt) >= 300:
+            text = txt
+    if jina:
+        # a Jina já devolve texto: basta normalizar espaços; para CloudWalk ela tem prioridade
+        txt = re.sub(r"\s{2,}", " ", jina).strip()
+        if len(txt) >= 200:
+            text = txt
+    return text, links, time.perf_counter() - t0
+
+
 def crawl():
     if not START_URLS:
         print("Adicione START_URLS no arquivo!"); return
-    seen=set(); q=list(START_URLS); n=0
-    while q and n < MAX_PAGES:
-        url=q.pop(0)
-        base = url.split("#",1)[0]  
-        if base in seen or not _ok(base): continue
-        seen.add(base)
-        try:
-            text = _fetch_with_fallback(url)
-            if text:
-                _save(base, text); n+=1
-                status, ctype, html = _fetch_raw(base)
-                if status==200 and "text/html" in ctype:
-                    soup = BeautifulSoup(html, "html.parser")
-                    for a in soup.find_all("a", href=True):
-                        nxt = urljoin(base, a["href"])
-                        if _ok(nxt) and nxt.split("#",1)[0] not in seen:
-                            q.append(nxt)
+
+    fetch_q: queue.Queue = queue.Queue(maxsize=MAX_IN_FLIGHT)
+    extract_q: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+    chunk_q: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+    write_q: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+    events: queue.Queue = queue.Queue()       # resultados de cada job -> coordenador
+    st_fetch = StageStats("fetch", MAX_WORKERS)
+    st_extract = StageStats("extract", EXTRACT_WORKERS)
+    st_chunk = StageStats("chunk", 1)
+    st_write = StageStats("write", 1)
+    stats = [st_fetch, st_extract, st_chunk, st_write]
+    queues = {"fetch": fetch_q, "extract": extract_q, "chunk": chunk_q, "write": write_q}
+
+    host_slots: dict[str, threading.BoundedSemaphore] = {}
+    host_lock = threading.Lock()
+
+    def host_slot(url):
+        host = urlparse(JINA).netloc if url.startswith(JINA) else urlparse(url).netloc
+        with host_lock:
+            return host_slots.setdefault(host, threading.BoundedSemaphore(PER_HOST_LIMIT))
+
+    def fetch_worker():
+        while (job := fetch_q.get()) is not None:
+            url, base, mode = job
+            target = JINA + url if mode == "jina" or "cloudwalk.io" in urlparse(url).netloc else url
+            t0 = time.perf_counter()
+            try:
+                with host_slot(target):
+                    page = _fetch(url, mode)
+            except Exception:
+                page = None
+            st_fetch.add(time.perf_counter() - t0, page["bytes"] if page else 0)
+            if page and (page["html"] or page["jina"]):
+                extract_q.put((base, mode, page))
+            else:
+                events.put((base, mode, None, []))
             time.sleep(SLEEP_BETWEEN)
-        except Exception:
-            pass
+
+    def extract_dispatcher(pool):
+        slots = threading.BoundedSemaphore(EXTRACT_WORKERS * 2)   # não despeja a fila toda no pool
+        while (job := extract_q.get()) is not None:
+            base, mode, page = job
+            slots.acquire()
+            fut = pool.submit(_extract, page["html"], page["jina"], base)
+
+            def done(f, base=base, mode=mode):
+                slots.release()
+                try:
+                    text, links, secs = f.result()
+                except Exception:
+                    text, links, secs = None, [], 0.0
+                st_extract.add(secs)
+                events.put((base, mode, text, links))
+            fut.add_done_callback(done)
+
+    def chunk_worker():
+        while (job := chunk_q.get()) is not None:
+            base, text = job
+            t0 = time.perf_counter()
+            chunks = chunk(text)
+            st_chunk.add(time.perf_counter() - t0)
+            write_q.put((base, text, chunks))
+        write_q.put(None)
+
+    def write_worker():
+        while (job := write_q.get()) is not None:
+            base, text, chunks = job
+            t0 = time.perf_counter()
+            _save(base, text)
+            save_chunks(CHUNKS_OUT, base, text, chunks)
+            st_write.add(time.perf_counter() - t0, len(text))
+
+    started = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS)
+    fetchers = [threading.Thread(target=fetch_worker, daemon=True) for _ in range(MAX_WORKERS)]
+    dispatcher = threading.Thread(target=extract_dispatcher, args=(pool,), daemon=True)
+    chunker = threading.Thread(target=chunk_worker, daemon=True)
+    writer = threading.Thread(target=write_worker, daemon=True)
+    for t in [*fetchers, dispatcher, chunker, writer]:
+        t.start()
+
+    # coordenador: fronteira, dedupe de URLs, fallback Jina e limite de páginas
+    seen = set(); frontier = list(START_URLS); pending_links: dict[str, list[str]] = {}
+    n = outstanding = 0
+    last_report = time.perf_counter()
+
+    def enqueue_links(links):
+        for nxt in links:
+            if _ok(nxt) and nxt.split("#", 1)[0] not in seen:
+                frontier.append(nxt)
+
+    try:
+        while True:
+            while frontier and n + outstanding < MAX_PAGES and outstanding < MAX_IN_FLIGHT:
+                url = frontier.pop(0)
+                base = url.split("#", 1)[0]
+                if base in seen or not _ok(base): continue
+                seen.add(base)
+                if base.lower().endswith(".xml"):
+                    # sitemap: não é página; enfileira as URLs listadas nele
+                    enqueue_links([loc for loc, _ in _parse_sitemap(base)])
+                    continue
+                fetch_q.put((url, base, "page")); outstanding += 1
+            if outstanding == 0:
+                break
+
+            base, mode, text, links = events.get(); outstanding -= 1
+            if text:
+                n += 1
+                chunk_q.put((base, text))
+                enqueue_links(links or pending_links.pop(base, []))
+            elif mode == "page" and "cloudwalk.io" not in urlparse(base).netloc:
+                # HTML sem texto suficiente: tenta a versão renderizada pela Jina
+                pending_links[base] = links
+                fetch_q.put((base, base, "jina")); outstanding += 1
+            else:
+                pending_links.pop(base, None)
+
+            if time.perf_counter() - last_report >= PROGRESS_EVERY:
+                print(f"{n} páginas coletadas, {outstanding} em andamento, {len(frontier)} na fronteira.")
+                _report(stats, started, queues)
+                last_report = time.perf_counter()
+    finally:
+        for _ in fetchers:
+            fetch_q.put(None)
+        for t in fetchers:
+            t.join()
+        extract_q.put(None); dispatcher.join()
+        pool.shutdown(wait=True)
+        chunk_q.put(None); chunker.join(); writer.join()
+
     print(f"Coletadas {n} páginas.")
+    _report(stats, started)
 
 if __name__=="__main__":
     crawl()
@@ -1,30 +1,44 @@
+"""
+Baixa (via Jina) as páginas de pilares e do código de ética e indexa no shard
+live pela API em execução: POST /admin/documents e depois /admin/live/compact.
+Não abre o Store neste processo, para não disputar o WAL (data/wal.jsonl) e a
+compactação com a API.
+
+    ADMIN_API_KEY=... python scripts/seed_pilars_jina.py [--api http://127.0.0.1:8000]
+"""
+import os
+import argparse
 import requests
-from app.deps import get_store
 
 URLS = [
     "https://r.jina.ai/https://www.cloudwalk.io/#our-pillars",
     "https://r.jina.ai/https://www.cloudwalk.io/code-of-ethics-and-conduct",
 ]
 
-def add_to_store(text, url):
-    s = get_store()
-    s.texts.append(text)
-    s.meta.append(url)
-    emb = s.embed(text)
-    s.index.add(emb)
-    print("ADICIONADO:", url)
+def add_to_api(api, headers, text, url):
+    # vai para o shard "live" (FAISS + BM25) e para o WAL da API; upsert substitui se já existir
+    r = requests.post(f"{api}/admin/documents", json={"url": url, "text": text}, headers=headers, timeout=120)
+    r.raise_for_status()
+    print(f"ADICIONADO: {url} ({r.json()['chunks']} chunks)")
 
 def main():
-    s = get_store()
-    existing = {str(m) for m in s.meta}
+    ap = argparse.ArgumentParser(description="Indexa as páginas de pilares/ética via API.")
+    ap.add_argument("--api", default=os.getenv("API_URL", "http://127.0.0.1:8000"))
+    args = ap.parse_args()
+    key = os.getenv("ADMIN_API_KEY")
+    if not key:
+        raise SystemExit("Defina ADMIN_API_KEY (a mesma da API).")
+    headers = {"X-Api-Key": key}
+    api = args.api.rstrip("/")
 
     for url in URLS:
-        if url not in existing:
-            print(">> Baixando", url)
-            txt = requests.get(url).text
-            add_to_store(txt, url)
-        else:
-            print(">> Já existe no índice:", url)
+        print(">> Baixando", url)
+        txt = requests.get(url).text
+        add_to_api(api, headers, txt, url)
+
+    r = requests.post(f"{api}/admin/live/compact", headers=headers, timeout=300)
+    r.raise_for_status()
+    print("Compactação:", r.json())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,142 @@
+"""
+Servidor de um shard (FAISS + BM25) para o modo coordenador do Store.
+
+Cada processo carrega só o seu shard de index/shards/<nome>/ (sem
+SentenceTransformer nem LLM) e responde no protocolo binário de
+app/shard_rpc.py. Exemplo com dois shards na mesma máquina:
+
+    python scripts/shard_server.py --shard cloudwalk --port 9101
+    python scripts/shard_server.py --shard blog --port 9102
+
+    SHARD_SERVERS=cloudwalk=http://127.0.0.1:9101,blog=http://127.0.0.1:9102
+
+Depois de reconstruir o shard (build_index.py --shard <nome>), POST /reload
+(ou /admin/shards/<nome>/reload no coordenador) troca o índice sem derrubar o
+processo.
+"""
+import sys, json, pathlib, argparse, socket, struct, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from app.shard_rpc import (
+    decode_search_request, encode_docs, encode_search_response, pack_priors,
+)
+from app.shards import Shard
+
+
+class ShardState:
+    def __init__(self, name: str, path: pathlib.Path):
+        self.name, self.path = name, path
+        self._lock = threading.Lock()
+        self.shard = Shard.load(name, path)
+
+    def reload(self):
+        sh = Shard.load(self.name, self.path)
+        with self._lock:
+            self.shard = sh
+        return sh
+
+    def info(self, sh=None) -> dict:
+        sh = sh or self.shard
+        return {
+            "name": sh.name, "version": sh.version, "chunks": len(sh), "dim": sh.index.d,
+            "n_docs": sh.bm25.n_docs, "total_len": sh.bm25.term_stats([]).total_len,
+        }
+
+
+def make_handler(state: ShardState, verbose: bool):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive: o coordenador reaproveita a conexão
+
+        def setup(self):
+            super().setup()
+            # respostas pequenas em duas escritas (headers + corpo): sem isso o Nagle segura ~40ms
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def log_message(self, fmt, *a):
+            if verbose:
+                print(f"[{state.name}] " + fmt % a)
+
+        def _send(self, status, body: bytes, sh, ctype="application/octet-stream"):
+            self.send_response(status)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            if sh is not None and sh.version:
+                self.send_header("X-Shard-Version", sh.version)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _json(self, status, payload, sh=None):
+            self._send(status, json.dumps(payload).encode("utf-8"), sh, "application/json")
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def do_GET(self):
+            sh = state.shard   # um snapshot por requisição (reload troca o objeto)
+            url = urlparse(self.path)
+            if url.path == "/info":
+                return self._json(200, state.info(sh), sh)
+            if url.path == "/lookup":
+                needle = parse_qs(url.query).get("contains", [""])[0]
+                if not needle:
+                    return self._json(400, {"error": "contains é obrigatório"}, sh)
+                matches = sh.url_matches(needle)
+                ids = [i for i, _ in matches]
+                body = struct.pack("<I", len(ids)) + np.asarray(ids, dtype="<i8").tobytes()
+                docs = [(sh.texts[i], u) for i, u in matches]
+                return self._send(200, body + encode_docs(docs), sh)
+            self._json(404, {"error": "not found"})
+
+        def do_POST(self):
+            sh = state.shard
+            path = urlparse(self.path).path
+            body = self._body()
+            if path == "/search":
+                q, tokens, k, stats = decode_search_request(body)
+                if q.shape[1] != sh.index.d:
+                    return self._json(400, {"error": f"dimensão {q.shape[1]} != {sh.index.d}"}, sh)
+                dense, lexical = sh.search(q, tokens, k, stats)
+                resp = encode_search_response(
+                    dense, lexical, pack_priors(sh.prior_rows(dense[0])), pack_priors(sh.prior_rows(lexical[0])),
+                )
+                return self._send(200, resp, sh)
+            if path == "/df":
+                tokens = body.decode("utf-8").split()
+                df = sh.term_stats(tokens).df
+                return self._send(200, np.asarray([df[t] for t in tokens], dtype="<u4").tobytes(), sh)
+            if path == "/docs":
+                ids = np.frombuffer(body, dtype="<i8")
+                if len(ids) and (ids.min() < 0 or ids.max() >= len(sh.texts)):
+                    return self._json(400, {"error": "id fora do shard"}, sh)
+                return self._send(200, encode_docs(sh.docs(ids.tolist())), sh)
+            if path == "/reload":
+                sh = state.reload()
+                print(f"[SHARD] {state.name} recarregado: {len(sh)} chunks (versão {sh.version}).")
+                return self._json(200, state.info(sh), sh)
+            self._json(404, {"error": "not found"})
+
+    return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve um shard (FAISS + BM25) via HTTP binário.")
+    ap.add_argument("--shard", required=True)
+    ap.add_argument("--dir", type=pathlib.Path, default=pathlib.Path("index/shards"))
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9101)
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+
+    state = ShardState(args.shard, args.dir / args.shard)
+    info = state.info()
+    print(f"[SHARD] {info['name']}: {info['chunks']} chunks (versão {info['version']}) "
+          f"em http://{args.host}:{args.port}")
+    ThreadingHTTPServer((args.host, args.port), make_handler(state, args.verbose)).serve_forever()
+
+
+if __name__ == "__main__":
+    main()